@@ -7,7 +7,7 @@ class AddressSerializer(serializers.ModelSerializer):
         model = Address
         fields = ['id', 'label', 'full_name', 'phone_number', 'address_line1', 
                   'address_line2', 'city', 'state', 'pincode', 'landmark', 
-                  'is_default', 'created_at', 'updated_at']
+                  'latitude', 'longitude', 'is_default', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
 
     def create(self, validated_data):
@@ -0,0 +1,115 @@
+"""
+Guest carts.
+
+Anonymous shoppers get a Cart row without a user. The cart is identified by
+a signed token holding its id, handed out in the X-Guest-Cart response
+header and the `guest_cart` cookie and read back from either. Guest carts
+always live in the cart tables. When the shopper logs in, their guest lines
+are folded into their own cart (see merge_guest_cart) and the guest cart is
+deleted.
+"""
+
+from django.core import signing
+from django.db import transaction
+
+from .models import Cart, CartItem
+from .serializers import CartSerializer
+from .storage import DatabaseCartStorage, get_cart_storage, row_etag
+
+GUEST_CART_COOKIE = 'guest_cart'
+GUEST_CART_HEADER = 'X-Guest-Cart'
+GUEST_CART_SALT = 'cart.guest'
+GUEST_CART_MAX_AGE = 60 * 60 * 24 * 30
+
+guest_storage = DatabaseCartStorage()
+
+
+def guest_cart_token(cart):
+    return signing.dumps(cart.id, salt=GUEST_CART_SALT)
+
+
+def guest_cart_id(request):
+    """Id of the guest cart named by the request's token, if it is valid"""
+    token = request.headers.get(GUEST_CART_HEADER) or request.COOKIES.get(GUEST_CART_COOKIE)
+    if not token:
+        return None
+    try:
+        return signing.loads(token, salt=GUEST_CART_SALT, max_age=GUEST_CART_MAX_AGE)
+    except signing.BadSignature:
+        return None
+
+
+def get_guest_cart(request, create=True):
+    cart_id = guest_cart_id(request)
+    cart = None
+    if cart_id is not None:
+        cart = Cart.objects.filter(pk=cart_id, user__isnull=True, is_active=True).first()
+    if cart is None and create:
+        cart = Cart.objects.create(user=None)
+    return cart
+
+
+def empty_cart_data():
+    """What an empty cart looks like, without creating one for the guest"""
+    cart = Cart(pk=0)
+    cart._prefetched_objects_cache = {'items': CartItem.objects.none()}
+    return {**CartSerializer(cart).data, 'id': None}
+
+
+def request_cart(request, create=True):
+    """
+    Return (storage, cart) for the request: the user's cart from the
+    configured storage, or the guest cart for anonymous requests.
+    """
+    if request.user.is_authenticated:
+        storage = get_cart_storage()
+        return storage, storage.get_cart(request.user, create=create)
+    cart = get_guest_cart(request, create=create)
+    request.guest_cart = cart
+    return guest_storage, cart
+
+
+def guest_cart_etag(request):
+    cart_id = guest_cart_id(request)
+    if cart_id is None:
+        return None
+    return row_etag(Cart.objects.filter(pk=cart_id, user__isnull=True, is_active=True))
+
+
+def merge_guest_cart(request, user):
+    """
+    Fold the request's guest cart into the user's cart and delete it.
+    Returns the number of guest lines merged.
+    """
+    cart_id = guest_cart_id(request)
+    if cart_id is None:
+        return 0
+    with transaction.atomic():
+        guest_items = list(CartItem.objects.filter(cart_id=cart_id, cart__user__isnull=True))
+        # Delete first: of two concurrent logins only the one whose delete
+        # removed the cart merges it, the other waits on the row and skips
+        _, deleted = Cart.objects.filter(pk=cart_id, user__isnull=True).delete()
+        if not deleted.get(Cart._meta.label) or not guest_items:
+            return 0
+        storage = get_cart_storage()
+        storage.merge(storage.get_cart(user), guest_items)
+    return len(guest_items)
+
+
+class GuestCartMixin:
+    """Hand the guest cart token back on responses to anonymous requests"""
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        cart = getattr(request, 'guest_cart', None)
+        if cart is not None:
+            token = guest_cart_token(cart)
+            response[GUEST_CART_HEADER] = token
+            response.set_cookie(
+                GUEST_CART_COOKIE, token,
+                max_age=GUEST_CART_MAX_AGE,
+                secure=request.is_secure(),
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
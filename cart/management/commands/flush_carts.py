@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from cart.storage import get_cart_storage
+
+
+class Command(BaseCommand):
+    help = 'Write carts with unsaved changes from the cart cache back to the database'
+
+    def handle(self, *args, **options):
+        flushed = get_cart_storage().flush_pending()
+        self.stdout.write(self.style.SUCCESS(f'Flushed {flushed} cart(s)'))
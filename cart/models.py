@@ -5,10 +5,13 @@ from decimal import Decimal
 
 
 class Cart(models.Model):
+    # Guest carts have no user; see cart/guest.py
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
-        related_name='cart'
+        related_name='cart',
+        null=True,
+        blank=True
     )
     applied_coupon = models.ForeignKey(
         'coupons.Coupon',
@@ -18,6 +21,8 @@ class Cart(models.Model):
         related_name='carts'
     )
     is_active = models.BooleanField(default=True)
+    # Bumped on every change to the cart or its lines (see cart_delta)
+    version = models.PositiveBigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -29,6 +34,8 @@ class Cart(models.Model):
         ) or Decimal('0.00')
 
     def __str__(self):
+        if self.user_id is None:
+            return f"Guest cart #{self.pk}"
         return f"Cart of {self.user.email}"
 
 
@@ -0,0 +1,158 @@
+"""
+Cart pricing.
+
+CartPricing computes every amount shown on the cart screen and charged at
+checkout (subtotal, coupon discount, GST, delivery and platform fee) from a
+single load of the cart lines, so the cart quote and the order total come
+from the same code. The quote is priced for the delivery zone of the
+address the customer will check out with (see quote_pincode).
+"""
+
+import logging
+from decimal import Decimal
+
+from django.db.models import Prefetch, prefetch_related_objects
+
+from addresses.models import Address
+
+from .models import CartItem
+
+logger = logging.getLogger(__name__)
+
+FOOD_GST_RATE = Decimal('0.05')
+DELIVERY_GST_RATE = Decimal('0.18')
+PLATFORM_FEE = Decimal('10.00')
+FREE_DELIVERY_THRESHOLD = Decimal('99.00')
+
+# Delivery zones: zone -> (pincodes, delivery fee before GST)
+STANDARD_DELIVERY_FEE = Decimal('20.00')
+SECONDARY_DELIVERY_FEE = Decimal('40.00')
+CORE_PINCODES = ['520010', '520008', '520004', '520002']
+SECONDARY_PINCODES = ['520003', '520007', '520001', '520013', '520011', '521137']
+DELIVERY_ZONES = {
+    'core': (CORE_PINCODES, STANDARD_DELIVERY_FEE),
+    'secondary': (SECONDARY_PINCODES, SECONDARY_DELIVERY_FEE),
+}
+ZONE_BY_PINCODE = {
+    pincode: zone
+    for zone, (pincodes, _) in DELIVERY_ZONES.items()
+    for pincode in pincodes
+}
+
+TWO_PLACES = Decimal('0.01')
+
+
+def delivery_zone(pincode):
+    """Delivery zone of a pincode, or None if we do not deliver there"""
+    return ZONE_BY_PINCODE.get((pincode or '').strip())
+
+
+def delivery_fee_for_pincode(pincode):
+    """Base delivery fee for a pincode, or None if we do not deliver there"""
+    zone = delivery_zone(pincode)
+    return None if zone is None else DELIVERY_ZONES[zone][1]
+
+
+def default_pincode(user_id):
+    """Pincode of the user's default address, if they have an address"""
+    if user_id is None:
+        return None
+    return Address.objects.filter(user_id=user_id).order_by(
+        '-is_default', '-created_at'
+    ).values_list('pincode', flat=True).first()
+
+
+def quote_pincode(request):
+    """
+    Pincode the request's cart quote is priced for: ?pincode=, the pincode
+    of the user's address given by ?address_id=, else the pincode of their
+    default address. Memoized on the request, which the ETag and the view
+    share.
+    """
+    if '_quote_pincode' not in request.__dict__:
+        pincode = (request.query_params.get('pincode') or '').strip() or None
+        if pincode is None and request.user.is_authenticated:
+            address_id = request.query_params.get('address_id', '')
+            if address_id.isdigit():
+                pincode = Address.objects.filter(
+                    pk=address_id, user=request.user
+                ).values_list('pincode', flat=True).first()
+            if pincode is None:
+                pincode = default_pincode(request.user.id)
+        request._quote_pincode = pincode
+    return request._quote_pincode
+
+
+class CartPricing:
+    """
+    All amounts for one cart. `items` are the cart lines if the caller has
+    them already; `pincode` picks the delivery zone and its fee. Until an
+    address is known, or for a pincode we do not deliver to, the standard
+    fee is quoted and `deliverable` says which case it is (None, False).
+    """
+
+    def __init__(self, cart, items=None, pincode=None):
+        self.cart = cart
+        self.items = list(cart.items.all() if items is None else items)
+
+        self.subtotal = sum(
+            (item.price_at_added * item.quantity for item in self.items),
+            Decimal('0.00')
+        )
+
+        self.discount = Decimal('0.00')
+        if cart.applied_coupon_id is not None and cart.applied_coupon is not None:
+            try:
+                self.discount = cart.applied_coupon.calculate_discount(self.subtotal)
+            except (ArithmeticError, TypeError):
+                # A coupon with missing or malformed amounts gives no discount
+                logger.error(
+                    f"Discount calculation failed for coupon {cart.applied_coupon.code}",
+                    exc_info=True
+                )
+        self.discounted_subtotal = self.subtotal - self.discount
+
+        # GST is charged on what the customer actually pays for the food
+        self.food_gst = (self.discounted_subtotal * FOOD_GST_RATE).quantize(TWO_PLACES)
+
+        self.pincode = (pincode or '').strip() or None
+        self.delivery_zone = delivery_zone(self.pincode)
+        self.deliverable = None if self.pincode is None else self.delivery_zone is not None
+        zone_fee = DELIVERY_ZONES[self.delivery_zone][1] if self.delivery_zone else STANDARD_DELIVERY_FEE
+
+        self.free_delivery = self.subtotal >= FREE_DELIVERY_THRESHOLD
+        self.original_delivery_fee = zone_fee
+        self.delivery_fee_base = Decimal('0.00') if self.free_delivery else self.original_delivery_fee
+        self.delivery_gst = (self.delivery_fee_base * DELIVERY_GST_RATE).quantize(TWO_PLACES)
+
+        self.total_gst = self.food_gst + self.delivery_gst
+        self.platform_fee = PLATFORM_FEE
+        self.grand_total = (
+            self.discounted_subtotal
+            + self.food_gst
+            + self.delivery_fee_base
+            + self.delivery_gst
+            + self.platform_fee
+        )
+
+    @classmethod
+    def for_cart(cls, cart, pincode=None):
+        """
+        Pricing memoized on the cart instance, for `pincode` or else the
+        pincode of the cart owner's default address. The cart lines are
+        prefetched with their juices so serializing the items afterwards
+        reuses them.
+        """
+        if pincode is None:
+            if '_default_pincode' not in cart.__dict__:
+                cart._default_pincode = default_pincode(cart.user_id)
+            pincode = cart._default_pincode
+        memo = cart.__dict__.setdefault('_pricing', {})
+        if pincode not in memo:
+            if 'items' not in getattr(cart, '_prefetched_objects_cache', {}):
+                prefetch_related_objects(
+                    [cart],
+                    Prefetch('items', queryset=CartItem.objects.select_related('juice'))
+                )
+            memo[pincode] = cls(cart, pincode=pincode)
+        return memo[pincode]
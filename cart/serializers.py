@@ -1,11 +1,13 @@
 from rest_framework import serializers
 from .models import Cart, CartItem
 from coupons.serializers import CouponSerializer
-from decimal import Decimal
+from products.images import image_url, image_variants
+from .pricing import CartPricing, quote_pincode
 
 class CartItemSerializer(serializers.ModelSerializer):
     juice_name = serializers.CharField(source='juice.name', read_only=True)
     juice_image = serializers.SerializerMethodField()
+    juice_image_variants = serializers.SerializerMethodField()
     subtotal = serializers.SerializerMethodField()
 
     class Meta:
@@ -15,6 +17,7 @@ class CartItemSerializer(serializers.ModelSerializer):
             'juice',
             'juice_name',
             'juice_image',
+            'juice_image_variants',
             'quantity',
             'price_at_added',
             'subtotal',
@@ -22,15 +25,11 @@ class CartItemSerializer(serializers.ModelSerializer):
         ]
     
     def get_juice_image(self, obj):
-        if obj.juice and obj.juice.image:
-            # Get the image name/path
-            image_path = str(obj.juice.image)
-            # Remove 'media/' prefix if present
-            if image_path.startswith('media/'):
-                image_path = image_path.replace('media/', '', 1)
-            # Return proper Cloudinary URL
-            return f"https://res.cloudinary.com/dxizjczfh/image/upload/{image_path}"
-        return None
+        return image_url(obj.juice.image.name) if obj.juice else None
+
+    def get_juice_image_variants(self, obj):
+        # Cart lines render a thumbnail; the larger sizes only bloat the cart
+        return image_variants(obj.juice.image.name, ('thumbnail',)) if obj.juice else None
 
     def get_subtotal(self, obj):
         return obj.price_at_added * obj.quantity
@@ -52,11 +51,15 @@ class CartSerializer(serializers.ModelSerializer):
     grand_total = serializers.SerializerMethodField()
     free_delivery = serializers.SerializerMethodField()
     original_delivery_fee = serializers.SerializerMethodField()
+    delivery_pincode = serializers.SerializerMethodField()
+    delivery_zone = serializers.SerializerMethodField()
+    deliverable = serializers.SerializerMethodField()
 
     class Meta:
         model = Cart
         fields = [
             'id',
+            'version',
             'items',
             'total_amount',
             'applied_coupon',
@@ -68,59 +71,85 @@ class CartSerializer(serializers.ModelSerializer):
             'platform_fee',
             'grand_total',
             'free_delivery',
-            'original_delivery_fee'
+            'original_delivery_fee',
+            'delivery_pincode',
+            'delivery_zone',
+            'deliverable'
         ]
     
+    def to_representation(self, instance):
+        # Price first: it prefetches the lines that `items` then serializes
+        self.pricing(instance)
+        return super().to_representation(instance)
+
+    def pricing(self, obj):
+        # Priced for the request's delivery address when there is a request
+        request = self.context.get('request')
+        return CartPricing.for_cart(obj, quote_pincode(request) if request is not None else None)
+
     def get_coupon_discount(self, obj):
-        if obj.applied_coupon:
-            return float(obj.applied_coupon.calculate_discount(obj.total_amount))
-        return 0.00
+        return float(self.pricing(obj).discount)
     
     def get_food_gst(self, obj):
-        return float((Decimal(str(obj.total_amount)) * Decimal('0.05')).quantize(Decimal('0.01')))
+        return float(self.pricing(obj).food_gst)
     
     def get_delivery_fee_base(self, obj):
-        if Decimal(str(obj.total_amount)) >= Decimal('99.00'):
-            return 0.00
-        return 20.00
+        return float(self.pricing(obj).delivery_fee_base)
     
     def get_delivery_gst(self, obj):
-        delivery_base = self.get_delivery_fee_base(obj)
-        return float((Decimal(str(delivery_base)) * Decimal('0.18')).quantize(Decimal('0.01')))
+        return float(self.pricing(obj).delivery_gst)
     
     def get_total_gst(self, obj):
-        food_gst = (Decimal(str(obj.total_amount)) * Decimal('0.05')).quantize(Decimal('0.01'))
-        delivery_base = Decimal(str(self.get_delivery_fee_base(obj)))
-        delivery_gst = (delivery_base * Decimal('0.18')).quantize(Decimal('0.01'))
-        return float(food_gst + delivery_gst)
+        return float(self.pricing(obj).total_gst)
     
     def get_platform_fee(self, obj):
-        return 10.00
+        return float(self.pricing(obj).platform_fee)
     
     def get_free_delivery(self, obj):
-        # Return True if subtotal >= ₹99
-        return Decimal(str(obj.total_amount)) >= Decimal('99.00')
+        # True if subtotal >= ₹99
+        return self.pricing(obj).free_delivery
     
     def get_original_delivery_fee(self, obj):
         # Show original price only when free delivery is active
-        if self.get_free_delivery(obj):
-            return 20.00
+        pricing = self.pricing(obj)
+        if pricing.free_delivery:
+            return float(pricing.original_delivery_fee)
         return None
     
     def get_grand_total(self, obj):
-        food_subtotal = Decimal(str(obj.total_amount))
-        
-        # Apply coupon discount to subtotal
-        coupon_discount = Decimal('0.00')
-        if obj.applied_coupon:
-            coupon_discount = obj.applied_coupon.calculate_discount(food_subtotal)
-        
-        discounted_subtotal = food_subtotal - coupon_discount
-        
-        food_gst = (discounted_subtotal * Decimal('0.05')).quantize(Decimal('0.01'))
-        delivery_base = Decimal(str(self.get_delivery_fee_base(obj)))
-        delivery_gst = (delivery_base * Decimal('0.18')).quantize(Decimal('0.01'))
-        platform_fee = Decimal('10.00')
-        
-        total = discounted_subtotal + food_gst + delivery_base + delivery_gst + platform_fee
-        return float(total)
+        return float(self.pricing(obj).grand_total)
+
+    def get_delivery_pincode(self, obj):
+        return self.pricing(obj).pincode
+
+    def get_delivery_zone(self, obj):
+        return self.pricing(obj).delivery_zone
+
+    def get_deliverable(self, obj):
+        # None until the cart has a delivery address
+        return self.pricing(obj).deliverable
+
+
+class CartTotalsSerializer(CartSerializer):
+    """Everything CartSerializer returns except the lines"""
+
+    class Meta(CartSerializer.Meta):
+        fields = [field for field in CartSerializer.Meta.fields if field not in ('id', 'version', 'items')]
+
+
+def cart_delta(cart, juice_ids, context=None):
+    """
+    The part of a cart a client has to redraw after the lines of the given
+    juices changed: those lines, the ones among them that are gone, the
+    recomputed totals and the new version.
+    """
+    totals = CartTotalsSerializer(cart, context=context).data
+    lines = {item.juice_id: item for item in cart.items.all()}
+    return {
+        'version': cart.version,
+        'items': CartItemSerializer(
+            [lines[juice_id] for juice_id in juice_ids if juice_id in lines], many=True
+        ).data,
+        'removed': [juice_id for juice_id in juice_ids if juice_id not in lines],
+        'totals': totals,
+    }
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import CartItem
+from .utils import touch_cart
+
+
+@receiver(post_save, sender=CartItem)
+@receiver(post_delete, sender=CartItem)
+def mark_cart_changed(sender, instance, **kwargs):
+    """Item changes bump the parent cart's updated_at (used for ETags)"""
+    touch_cart(instance.cart_id)
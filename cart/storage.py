@@ -0,0 +1,577 @@
+"""
+Pluggable storage for live carts.
+
+The cart views read and change carts through the backend named by
+settings.CART_STORAGE_BACKEND:
+
+- DatabaseCartStorage (default) works on the cart tables directly.
+- CachedCartStorage keeps the live cart in the Django cache and writes it
+  back to the tables behind the requests: once CART_WRITE_BEHIND_SECONDS
+  have passed since the last write-back, before checkout reads the cart and
+  from the `flush_carts` command. A cache miss reloads the cart from the
+  tables, so losing the cache only loses changes not yet written back.
+
+Both backends hand out Cart instances with their lines already loaded, so
+CartSerializer and CartPricing work the same on either.
+"""
+
+import time
+import uuid
+from contextlib import contextmanager
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from products.models import Juice
+from .models import Cart, CartItem
+from .utils import change_item_quantity, delete_cart_items, touch_cart
+
+
+class CartBusy(APIException):
+    """Another request held the cart's lock for longer than we wait"""
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = {'message': 'Your cart is being updated, please try again'}
+    default_code = 'cart_busy'
+
+
+def upsert_options(update_fields):
+    """bulk_create() arguments that update a cart line that already exists"""
+    options = {'update_conflicts': True, 'update_fields': update_fields}
+    if connection.features.supports_update_conflicts_with_target:
+        options['unique_fields'] = ['cart', 'juice']
+    return options
+
+
+def row_etag(carts):
+    """ETag built from the row of the cart in `carts`, not its contents"""
+    state = carts.values_list('id', 'updated_at', 'applied_coupon_id').first()
+    if state is None:
+        return None
+    cart_id, updated_at, coupon_id = state
+    return f"cart-{cart_id}-{int(updated_at.timestamp() * 1000000)}-{coupon_id or 0}"
+
+
+def merged_lines(lines, guest_items):
+    """
+    Fold guest CartItems into {juice_id: [quantity, instructions]} lines:
+    quantities add up and guest instructions win when they are set.
+    """
+    for item in guest_items:
+        line = lines.setdefault(item.juice_id, [0, ''])
+        line[0] += item.quantity
+        line[1] = item.cooking_instructions or line[1]
+    return lines
+
+
+class DatabaseCartStorage:
+    """Every cart read and write goes straight to the cart tables"""
+
+    def get_cart(self, user, create=True):
+        if create:
+            cart, created = Cart.objects.get_or_create(user=user, is_active=True)
+            return cart
+        return Cart.objects.filter(user=user, is_active=True).first()
+
+    def add_item(self, cart, juice, quantity):
+        # Add to an existing line in one UPDATE, else insert the line
+        if change_item_quantity(cart.id, juice.id, quantity) is None:
+            try:
+                with transaction.atomic():
+                    CartItem.objects.create(
+                        cart=cart,
+                        juice=juice,
+                        quantity=quantity,
+                        price_at_added=juice.price
+                    )
+                return
+            except IntegrityError:
+                # A concurrent request inserted the line first
+                change_item_quantity(cart.id, juice.id, quantity)
+        touch_cart(cart.id)
+
+    def change_quantity(self, cart, juice_id, delta):
+        """New quantity, 0 when the line was removed, None when it is missing"""
+        quantity = change_item_quantity(cart.id, juice_id, delta)
+        if quantity is not None:
+            touch_cart(cart.id)
+        return quantity
+
+    def remove_item(self, cart, juice_id):
+        deleted, _ = CartItem.objects.filter(cart=cart, juice_id=juice_id).delete()
+        return bool(deleted)
+
+    def set_instructions(self, cart, juice_id, instructions):
+        """Returns False when the cart has no such line"""
+        try:
+            item = CartItem.objects.get(cart=cart, juice_id=juice_id)
+        except CartItem.DoesNotExist:
+            return False
+        item.cooking_instructions = instructions
+        item.save()
+        return True
+
+    def set_coupon(self, cart, coupon):
+        Cart.objects.filter(pk=cart.pk).update(
+            applied_coupon=coupon,
+            updated_at=timezone.now(),
+            version=F('version') + 1
+        )
+        cart.applied_coupon = coupon
+
+    @contextmanager
+    def edit(self, cart, juice_ids):
+        """
+        Lock the cart lines of the given juices and yield them keyed by
+        juice id; write_lines() inside the block stores the changes.
+        """
+        with transaction.atomic():
+            yield {
+                item.juice_id: item
+                for item in CartItem.objects.select_for_update().filter(
+                    cart=cart,
+                    juice_id__in=juice_ids
+                )
+            }
+
+    def write_lines(self, cart, created=(), updated=(), deleted=()):
+        """Persist new and changed CartItems and drop the deleted juice ids"""
+        if created:
+            CartItem.objects.bulk_create(created)
+        if updated:
+            CartItem.objects.bulk_update(updated, ['quantity', 'cooking_instructions'])
+        if deleted:
+            CartItem.objects.filter(cart=cart, juice_id__in=deleted).delete()
+        if created or updated or deleted:
+            # bulk writes skip the CartItem signals
+            touch_cart(cart.id)
+
+    def merge(self, cart, guest_items):
+        """Fold the lines of a guest cart into this cart with one upsert"""
+        if not guest_items:
+            return
+        current = {
+            juice_id: [quantity, instructions]
+            for juice_id, quantity, instructions in CartItem.objects.filter(
+                cart=cart,
+                juice_id__in=[item.juice_id for item in guest_items]
+            ).values_list('juice_id', 'quantity', 'cooking_instructions')
+        }
+        lines = merged_lines(current, guest_items)
+        prices = {item.juice_id: item.price_at_added for item in guest_items}
+        CartItem.objects.bulk_create(
+            [
+                CartItem(
+                    cart=cart,
+                    juice_id=juice_id,
+                    quantity=quantity,
+                    price_at_added=prices[juice_id],
+                    cooking_instructions=instructions
+                )
+                for juice_id, (quantity, instructions) in lines.items()
+            ],
+            # Lines already in the cart keep the price they were added at
+            **upsert_options(['quantity', 'cooking_instructions'])
+        )
+        touch_cart(cart.id)
+
+    def clear(self, cart):
+        """Empty the cart and drop its coupon (after an order is placed)"""
+        delete_cart_items(cart.id)
+        self.set_coupon(cart, None)
+
+    def refresh_version(self, cart):
+        """Bring cart.version up to date after changing the cart"""
+        cart.refresh_from_db(fields=['version'])
+
+    def flush(self, cart):
+        """Make sure the cart tables hold the latest cart"""
+
+    def flush_pending(self):
+        """Write back every cart with unsaved changes; returns how many"""
+        return 0
+
+    def etag(self, user):
+        return row_etag(Cart.objects.filter(user=user, is_active=True))
+
+
+class CachedCartStorage(DatabaseCartStorage):
+    """
+    Live carts in the cache, written back to the tables behind the requests.
+
+    A cart is cached as {'id', 'user', 'coupon', 'lines', 'version', 'dirty',
+    'flushed'} where lines maps juice id -> [quantity, price, instructions,
+    CartItem id]. New lines are inserted right away, so every line has its
+    real id; only changes to existing lines are written behind. Changes
+    take a short per-user lock in the cache and a cart whose state has
+    unsaved changes carries a `cart-dirty:<user id>` marker.
+    """
+    STATE_TIMEOUT = 60 * 60 * 24 * 7
+    LOCK_TIMEOUT = 5
+    LOCK_WAIT = 1.0
+    FLUSH_BATCH_SIZE = 500
+
+    def _key(self, user_id):
+        return f"cart-state:{user_id}"
+
+    def _dirty_key(self, user_id):
+        return f"cart-dirty:{user_id}"
+
+    @contextmanager
+    def _locked(self, user_id):
+        """Hold the cart's lock, or raise CartBusy after LOCK_WAIT seconds"""
+        key = f"cart-lock:{user_id}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.LOCK_WAIT
+        while not cache.add(key, token, self.LOCK_TIMEOUT):
+            # The lock expires on its own if its holder died
+            if time.monotonic() >= deadline:
+                raise CartBusy()
+            time.sleep(0.005)
+        try:
+            yield
+        finally:
+            # Not if it expired and someone else holds it now
+            if cache.get(key) == token:
+                cache.delete(key)
+
+    def _state(self, user_id, create=True):
+        """The cached cart, loaded from the tables on a miss"""
+        state = cache.get(self._key(user_id))
+        if state is not None:
+            return state
+
+        if create:
+            cart, created = Cart.objects.get_or_create(user_id=user_id, is_active=True)
+        else:
+            cart = Cart.objects.filter(user_id=user_id, is_active=True).first()
+            if cart is None:
+                return None
+        lines = {
+            juice_id: [quantity, str(price), instructions, item_id]
+            for item_id, juice_id, quantity, price, instructions in CartItem.objects.filter(
+                cart=cart
+            ).order_by('id').values_list(
+                'id', 'juice_id', 'quantity', 'price_at_added', 'cooking_instructions'
+            )
+        }
+        state = {
+            'id': cart.id,
+            'user': user_id,
+            'coupon': cart.applied_coupon_id,
+            'lines': lines,
+            # Seeded from the clock so a reloaded cart never reuses an ETag
+            'version': max(cart.version, time.time_ns() // 1000),
+            'dirty': False,
+            'flushed': time.time(),
+        }
+        # add() so a concurrent change cached in the meantime is not lost
+        cache.add(self._key(user_id), state, self.STATE_TIMEOUT)
+        return cache.get(self._key(user_id)) or state
+
+    def _changed(self, state):
+        state['version'] += 1
+        if not state['dirty']:
+            state['dirty'] = True
+            # add() is atomic; an existing marker already covers this cart
+            cache.add(self._dirty_key(state['user']), 1, self.STATE_TIMEOUT)
+
+    def _insert_lines(self, state, juice_ids):
+        """Insert new lines now so they have their CartItem id from the start"""
+        lines = state['lines']
+        items = CartItem.objects.bulk_create(
+            [
+                CartItem(
+                    cart_id=state['id'],
+                    juice_id=juice_id,
+                    quantity=lines[juice_id][0],
+                    price_at_added=Decimal(lines[juice_id][1]),
+                    cooking_instructions=lines[juice_id][2]
+                )
+                for juice_id in juice_ids
+            ],
+            # The row of a line removed but not yet written back is reused
+            **upsert_options(['quantity', 'price_at_added', 'cooking_instructions'])
+        )
+        if any(item.pk is None for item in items):
+            # The database did not return the ids of upserted rows
+            items = CartItem.objects.filter(cart_id=state['id'], juice_id__in=juice_ids)
+        for item in items:
+            lines[item.juice_id][3] = item.pk
+
+    def _save(self, user_id, state):
+        """Store the state, writing it back once the write-behind delay is up"""
+        if state['dirty'] and time.time() - state['flushed'] >= settings.CART_WRITE_BEHIND_SECONDS:
+            self._write_back(state)
+        cache.set(self._key(user_id), state, self.STATE_TIMEOUT)
+
+    def _write_back(self, state):
+        lines = state['lines']
+        items = [
+            CartItem(
+                cart_id=state['id'],
+                juice_id=juice_id,
+                quantity=quantity,
+                price_at_added=Decimal(price),
+                cooking_instructions=instructions
+            )
+            for juice_id, (quantity, price, instructions, item_id) in lines.items()
+        ]
+        with transaction.atomic():
+            delete_cart_items(state['id'], keep_juice_ids=lines)
+            if items:
+                CartItem.objects.bulk_create(
+                    items,
+                    **upsert_options(['quantity', 'price_at_added', 'cooking_instructions'])
+                )
+            Cart.objects.filter(pk=state['id']).update(
+                applied_coupon_id=state['coupon'],
+                updated_at=timezone.now(),
+                version=state['version']
+            )
+
+        for item in items:
+            if item.pk:
+                lines[item.juice_id][3] = item.pk
+        state['dirty'] = False
+        state['flushed'] = time.time()
+
+    def _attach(self, cart, state):
+        """Load the cached lines into the cart instance as its prefetched items"""
+        lines = state['lines']
+        prefetched = getattr(cart, '_prefetched_objects_cache', {}).get('items')
+        juices = {item.juice_id: item.juice for item in prefetched or ()}
+        missing = [juice_id for juice_id in lines if juice_id not in juices]
+        if missing:
+            juices.update(Juice.objects.in_bulk(missing))
+
+        items = CartItem.objects.filter(cart_id=cart.id)
+        items._result_cache = [
+            CartItem(
+                id=item_id,
+                cart=cart,
+                juice=juices[juice_id],
+                quantity=quantity,
+                price_at_added=Decimal(price),
+                cooking_instructions=instructions
+            )
+            for juice_id, (quantity, price, instructions, item_id) in lines.items()
+            if juice_id in juices
+        ]
+        items._prefetch_done = True
+        cart._prefetched_objects_cache = {'items': items}
+        cart.applied_coupon_id = state['coupon']
+        cart.version = state['version']
+        cart.__dict__['_cart_state'] = state
+        cart.__dict__.pop('_pricing', None)
+
+    @contextmanager
+    def _change(self, cart):
+        """Yield the cart's state under its lock, then store and reattach it"""
+        with self._locked(cart.user_id):
+            state = self._state(cart.user_id)
+            cart.__dict__['_cart_state'] = state
+            yield state
+            self._save(cart.user_id, state)
+        self._attach(cart, state)
+
+    def get_cart(self, user, create=True):
+        state = self._state(user.id, create)
+        if state is None:
+            return None
+        cart = Cart(id=state['id'], user=user, is_active=True)
+        cart._state.adding = False
+        self._attach(cart, state)
+        return cart
+
+    def add_item(self, cart, juice, quantity):
+        with self._change(cart) as state:
+            line = state['lines'].get(juice.id)
+            if line is None:
+                state['lines'][juice.id] = [quantity, str(juice.price), '', None]
+                self._insert_lines(state, [juice.id])
+            else:
+                line[0] += quantity
+            self._changed(state)
+
+    def change_quantity(self, cart, juice_id, delta):
+        with self._change(cart) as state:
+            line = state['lines'].get(juice_id)
+            if line is None:
+                return None
+            line[0] += delta
+            if line[0] < 1:
+                del state['lines'][juice_id]
+            self._changed(state)
+        return max(line[0], 0)
+
+    def remove_item(self, cart, juice_id):
+        with self._change(cart) as state:
+            removed = state['lines'].pop(juice_id, None) is not None
+            if removed:
+                self._changed(state)
+        return removed
+
+    def set_instructions(self, cart, juice_id, instructions):
+        with self._change(cart) as state:
+            line = state['lines'].get(juice_id)
+            if line is not None:
+                line[2] = instructions
+                self._changed(state)
+        return line is not None
+
+    def set_coupon(self, cart, coupon):
+        with self._change(cart) as state:
+            state['coupon'] = coupon.id if coupon else None
+            self._changed(state)
+        cart.applied_coupon = coupon
+
+    @contextmanager
+    def edit(self, cart, juice_ids):
+        with self._change(cart) as state:
+            yield {
+                juice_id: CartItem(
+                    id=line[3],
+                    cart=cart,
+                    juice_id=juice_id,
+                    quantity=line[0],
+                    price_at_added=Decimal(line[1]),
+                    cooking_instructions=line[2]
+                )
+                for juice_id, line in state['lines'].items()
+                if juice_id in juice_ids
+            }
+
+    def write_lines(self, cart, created=(), updated=(), deleted=()):
+        # Only valid inside edit(), which stores the state on the way out
+        state = cart.__dict__['_cart_state']
+        lines = state['lines']
+        for item in [*created, *updated]:
+            item_id = lines[item.juice_id][3] if item.juice_id in lines else item.pk
+            lines[item.juice_id] = [
+                item.quantity, str(item.price_at_added), item.cooking_instructions, item_id
+            ]
+        for juice_id in deleted:
+            lines.pop(juice_id, None)
+        new = [juice_id for juice_id, line in lines.items() if line[3] is None]
+        if new:
+            self._insert_lines(state, new)
+        if created or updated or deleted:
+            self._changed(state)
+
+    def merge(self, cart, guest_items):
+        if not guest_items:
+            return
+        prices = {item.juice_id: str(item.price_at_added) for item in guest_items}
+        with self._change(cart) as state:
+            lines = state['lines']
+            current = {juice_id: [line[0], line[2]] for juice_id, line in lines.items()}
+            for juice_id, (quantity, instructions) in merged_lines(current, guest_items).items():
+                if juice_id in lines:
+                    lines[juice_id][0], lines[juice_id][2] = quantity, instructions
+                else:
+                    lines[juice_id] = [quantity, prices[juice_id], instructions, None]
+            new = [juice_id for juice_id, line in lines.items() if line[3] is None]
+            if new:
+                self._insert_lines(state, new)
+            self._changed(state)
+
+    def clear(self, cart):
+        # The tables are cleared in the caller's transaction and the cached
+        # cart only once it commits, so a rolled back order keeps the cart
+        delete_cart_items(cart.id)
+        super().set_coupon(cart, None)
+        transaction.on_commit(lambda: self._clear_state(cart.user_id))
+
+    def _clear_state(self, user_id):
+        try:
+            with self._locked(user_id):
+                state = cache.get(self._key(user_id))
+                if state is None:
+                    return
+                state['lines'] = {}
+                state['coupon'] = None
+                state['version'] += 1
+                # The tables were emptied by clear()
+                state['dirty'] = False
+                state['flushed'] = time.time()
+                cache.set(self._key(user_id), state, self.STATE_TIMEOUT)
+        except CartBusy:
+            # Reloaded from the (empty) tables on the next read instead
+            cache.delete(self._key(user_id))
+
+    def refresh_version(self, cart):
+        # Already current: every change reattaches the cached state
+        pass
+
+    def flush(self, cart):
+        with self._locked(cart.user_id):
+            state = cache.get(self._key(cart.user_id))
+            if state is not None and state['dirty']:
+                self._write_back(state)
+                cache.set(self._key(cart.user_id), state, self.STATE_TIMEOUT)
+
+    def flush_pending(self):
+        """
+        Write back every cart with a dirty marker. The candidates are the
+        users with an active cart, checked for markers in batches.
+        """
+        user_ids = Cart.objects.filter(
+            user__isnull=False,
+            is_active=True
+        ).values_list('user_id', flat=True).order_by('user_id')
+        flushed = 0
+        batch = []
+        for user_id in user_ids.iterator(chunk_size=self.FLUSH_BATCH_SIZE):
+            batch.append(user_id)
+            if len(batch) == self.FLUSH_BATCH_SIZE:
+                flushed += self._flush_marked(batch)
+                batch = []
+        if batch:
+            flushed += self._flush_marked(batch)
+        return flushed
+
+    def _flush_marked(self, user_ids):
+        markers = cache.get_many([self._dirty_key(user_id) for user_id in user_ids])
+        flushed = 0
+        for user_id in user_ids:
+            key = self._dirty_key(user_id)
+            if key not in markers:
+                continue
+            # Cleared first: a change after this point marks the cart again
+            cache.delete(key)
+            try:
+                with self._locked(user_id):
+                    state = cache.get(self._key(user_id))
+                    if state is None or not state['dirty']:
+                        continue
+                    self._write_back(state)
+                    cache.set(self._key(user_id), state, self.STATE_TIMEOUT)
+                    flushed += 1
+            except CartBusy:
+                # Busy right now; leave it for the next run
+                cache.add(key, 1, self.STATE_TIMEOUT)
+        return flushed
+
+    def etag(self, user):
+        state = self._state(user.id, create=False)
+        if state is None:
+            return None
+        return f"cart-{state['id']}-{state['version']}-{state['coupon'] or 0}"
+
+
+@lru_cache(maxsize=None)
+def _load_storage(path):
+    return import_string(path)()
+
+
+def get_cart_storage():
+    """The cart storage backend configured by CART_STORAGE_BACKEND"""
+    return _load_storage(settings.CART_STORAGE_BACKEND)
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import AddToCartAPIView, ViewCartAPIView, UpdateCartItemAPIView, RemoveCartItemAPIView, ApplyCouponAPIView, RemoveCouponAPIView, UpdateItemInstructionsAPIView
+from .views import AddToCartAPIView, BatchCartAPIView, ViewCartAPIView, CartRecommendationsAPIView, UpdateCartItemAPIView, RemoveCartItemAPIView, ApplyCouponAPIView, RemoveCouponAPIView, UpdateItemInstructionsAPIView
 
 urlpatterns = [
     path('', ViewCartAPIView.as_view(), name='view-cart'),
+    path('recommendations/', CartRecommendationsAPIView.as_view(), name='cart-recommendations'),
+    path('batch/', BatchCartAPIView.as_view(), name='batch-cart'),
     path('add/', AddToCartAPIView.as_view(), name='add-to-cart'),
     path('update/', UpdateCartItemAPIView.as_view(), name='update-cart-item'),
     path('remove/', RemoveCartItemAPIView.as_view(), name='remove-cart-item'),
@@ -1,14 +1,91 @@
-from .models import Cart
+from django.db import connection
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Cart, CartItem
 
 def get_or_create_cart(user):
-    cart, created = Cart.objects.get_or_create(
-        user=user,
-        is_active=True
-    )
-    return cart
+    """The user's live cart, from the configured cart storage"""
+    from .storage import get_cart_storage
+    return get_cart_storage().get_cart(user)
 
 def get_cart_total(cart):
     return sum(
         item.price_at_added * item.quantity
         for item in cart.items.all()
     )
+
+def change_item_quantity(cart_id, juice_id, delta):
+    """
+    Add `delta` to a cart line with a single conditional UPDATE and return
+    the new quantity, or None when the cart has no such line. A change that
+    would leave less than 1 deletes the line instead and returns 0. Raw
+    statements skip the CartItem signals, so callers touch the cart.
+    """
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    where = "cart_id = %s AND juice_id = %s"
+    floor = 1 - delta  # lowest quantity the change keeps at 1 or more
+
+    with connection.cursor() as cursor:
+        # A concurrent tap can land between the UPDATE and the DELETE; the
+        # quantity conditions make that show up as no row, so try again once
+        for attempt in range(2):
+            if connection.vendor in ('postgresql', 'sqlite'):
+                cursor.execute(
+                    f"UPDATE {table} SET quantity = quantity + %s "
+                    f"WHERE {where} AND quantity >= %s RETURNING quantity",
+                    [delta, cart_id, juice_id, floor]
+                )
+                row = cursor.fetchone()
+                if row is not None:
+                    return row[0]
+            else:
+                # No UPDATE ... RETURNING here; read back after the atomic update
+                lines = CartItem.objects.filter(cart_id=cart_id, juice_id=juice_id)
+                if lines.filter(quantity__gte=floor).update(quantity=F('quantity') + delta):
+                    return lines.values_list('quantity', flat=True).first()
+
+            if delta >= 0:
+                return None
+            cursor.execute(
+                f"DELETE FROM {table} WHERE {where} AND quantity < %s",
+                [cart_id, juice_id, floor]
+            )
+            if cursor.rowcount:
+                return 0
+        return None
+
+def delete_cart_items(cart_id, keep_juice_ids=()):
+    """
+    Delete a cart's lines, except those of `keep_juice_ids`, in one
+    statement. Like change_item_quantity this skips the CartItem signals,
+    so callers touch the cart.
+    """
+    table = connection.ops.quote_name(CartItem._meta.db_table)
+    keep = list(keep_juice_ids)
+    sql = f"DELETE FROM {table} WHERE cart_id = %s"
+    if keep:
+        sql += f" AND juice_id NOT IN ({', '.join(['%s'] * len(keep))})"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [cart_id, *keep])
+
+def touch_cart(cart_id):
+    """Mark a cart as changed so its ETag and version change without saving the row"""
+    Cart.objects.filter(pk=cart_id).update(updated_at=timezone.now(), version=F('version') + 1)
+
+def cart_etag(request, *args, **kwargs):
+    """
+    ETag for the request's cart, as cheap as the cart storage allows. The
+    quote's delivery pincode is part of it, since changing the default
+    address changes the totals without touching the cart.
+    """
+    from .guest import guest_cart_etag
+    from .pricing import quote_pincode
+    from .storage import get_cart_storage
+    if not request.user.is_authenticated:
+        etag = guest_cart_etag(request)
+    else:
+        etag = get_cart_storage().etag(request.user)
+    if etag is None:
+        return None
+    return f"{etag}-{quote_pincode(request) or 0}"
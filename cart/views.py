@@ -1,16 +1,37 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework import status
-
-from .models import Cart, CartItem
-from .serializers import CartSerializer
-from .utils import get_or_create_cart
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .guest import GuestCartMixin, empty_cart_data, request_cart
+from .models import CartItem
+from .serializers import CartSerializer, cart_delta
+from .storage import get_cart_storage
+from .utils import get_or_create_cart, cart_etag
+from products.availability import availability_index
 from products.models import Juice
+from products.recommendations import recommended_juices
 from coupons.models import Coupon
 
-class AddToCartAPIView(APIView):
-    permission_classes = [IsAuthenticated]
+def wants_delta(request):
+    """Mutations answer with cart_delta() instead of their usual body on ?delta=true"""
+    return request.query_params.get('delta') in ('1', 'true')
+
+def delta_response(request, storage, cart, juice_ids, message=None):
+    storage.refresh_version(cart)
+    body = cart_delta(cart, juice_ids, context={'request': request})
+    if message:
+        body = {"message": message, **body}
+    return Response(body, status=status.HTTP_200_OK)
+
+def is_integer(value):
+    """A JSON integer; bool is an int subclass, so true/false are rejected"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+class AddToCartAPIView(GuestCartMixin, APIView):
+    permission_classes = [AllowAny]
 
     def post(self, request):
         juice_id = request.data.get('juice_id')
@@ -30,34 +51,84 @@ class AddToCartAPIView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        cart = get_or_create_cart(request.user)
+        # Optional: reject products the customer's branch cannot sell
+        branch_id = request.data.get('branch_id')
+        if branch_id:
+            try:
+                branch_id = int(branch_id)
+            except (TypeError, ValueError):
+                return Response(
+                    {"message": "Invalid branch_id"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not availability_index.is_available(branch_id, juice.id):
+                return Response(
+                    {"message": f"{juice.name} is not available at the selected branch"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            juice=juice,
-            defaults={
-                'quantity': quantity,
-                'price_at_added': juice.price
-            }
-        )
+        storage, cart = request_cart(request)
+        storage.add_item(cart, juice, quantity)
 
-        if not created:
-            cart_item.quantity += quantity
-            cart_item.save()
+        if wants_delta(request):
+            return delta_response(request, storage, cart, [juice.id])
 
-        serializer = CartSerializer(cart)
+        storage.refresh_version(cart)
+        serializer = CartSerializer(cart, context={'request': request})
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-class ViewCartAPIView(APIView):
-    permission_classes = [IsAuthenticated]
+@method_decorator(condition(etag_func=cart_etag), name='get')
+class ViewCartAPIView(GuestCartMixin, APIView):
+    permission_classes = [AllowAny]
 
     def get(self, request):
-        cart = get_or_create_cart(request.user)
-        serializer = CartSerializer(cart)
+        since_version = request.query_params.get('since_version')
+        if since_version is not None and not since_version.isdigit():
+            return Response(
+                {"message": "since_version must be a non-negative integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        storage, cart = request_cart(request, create=request.user.is_authenticated)
+        if cart is None:
+            return Response(empty_cart_data())
+
+        # The client is up to date: an empty delta instead of the whole cart
+        if since_version is not None and int(since_version) == cart.version:
+            return Response({"version": cart.version, "items": [], "removed": []})
+
+        serializer = CartSerializer(cart, context={'request': request})
         return Response(serializer.data)
 
-class UpdateCartItemAPIView(APIView):
+class CartRecommendationsAPIView(APIView):
+    """
+    "You may also like" juices for the current cart. Pass ?branch_id= to
+    only suggest juices the branch can sell right now.
+    """
     permission_classes = [IsAuthenticated]
+    LIMIT = 6
+
+    def get(self, request):
+        cart = get_or_create_cart(request.user)
+        juice_ids = [item.juice_id for item in cart.items.all()]
+
+        branch_id = request.query_params.get('branch_id')
+        if branch_id and not branch_id.isdigit():
+            return Response(
+                {"message": "Invalid branch_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Over-fetch so filtering by branch still fills the list
+        results = recommended_juices(juice_ids, limit=self.LIMIT * 2 if branch_id else self.LIMIT)
+        if branch_id:
+            available = availability_index.available_products(int(branch_id))
+            results = [juice for juice in results if juice['id'] in available][:self.LIMIT]
+
+        return Response({"results": results})
+
+class UpdateCartItemAPIView(GuestCartMixin, APIView):
+    permission_classes = [AllowAny]
 
     def post(self, request):
         juice_id = request.data.get('juice_id')
@@ -69,46 +140,48 @@ class UpdateCartItemAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        cart = Cart.objects.filter(user=request.user, is_active=True).first()
+        try:
+            juice_id = int(juice_id)
+        except (TypeError, ValueError):
+            return Response(
+                {"message": "Invalid juice_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        storage, cart = request_cart(request, create=False)
         if not cart:
             return Response(
                 {"message": "Cart not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        try:
-            item = CartItem.objects.get(cart=cart, juice_id=juice_id)
-        except CartItem.DoesNotExist:
+        quantity = storage.change_quantity(cart, juice_id, 1 if action == 'increment' else -1)
+        if quantity is None:
             return Response(
                 {"message": "Item not in cart"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        if action == 'increment':
-            item.quantity += 1
-            item.save()
+        if wants_delta(request):
+            message = "Item removed from cart" if quantity == 0 else "Cart updated successfully"
+            return delta_response(request, storage, cart, [juice_id], message)
 
-        elif action == 'decrement':
-            if item.quantity > 1:
-                item.quantity -= 1
-                item.save()
-            else:
-                item.delete()
-                return Response(
-                    {"message": "Item removed from cart"},
-                    status=status.HTTP_200_OK
-                )
+        if quantity == 0:
+            return Response(
+                {"message": "Item removed from cart"},
+                status=status.HTTP_200_OK
+            )
 
         return Response(
             {
                 "message": "Cart updated successfully",
-                "item_quantity": item.quantity
+                "item_quantity": quantity
             },
             status=status.HTTP_200_OK
         )
 
-class RemoveCartItemAPIView(APIView):
-    permission_classes = [IsAuthenticated]
+class RemoveCartItemAPIView(GuestCartMixin, APIView):
+    permission_classes = [AllowAny]
 
     def delete(self, request):
         juice_id = request.data.get('juice_id')
@@ -119,24 +192,30 @@ class RemoveCartItemAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        cart = Cart.objects.filter(user=request.user, is_active=True).first()
+        try:
+            juice_id = int(juice_id)
+        except (TypeError, ValueError):
+            return Response(
+                {"message": "Invalid juice_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        storage, cart = request_cart(request, create=False)
         if not cart:
             return Response(
                 {"message": "Cart not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        deleted, _ = CartItem.objects.filter(
-            cart=cart,
-            juice_id=juice_id
-        ).delete()
-
-        if not deleted:
+        if not storage.remove_item(cart, juice_id):
             return Response(
                 {"message": "Item not found in cart"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
+        if wants_delta(request):
+            return delta_response(request, storage, cart, [juice_id], "Item removed successfully")
+
         return Response(
             {"message": "Item removed successfully"},
             status=status.HTTP_200_OK
@@ -154,7 +233,8 @@ class ApplyCouponAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        cart = get_or_create_cart(request.user)
+        storage = get_cart_storage()
+        cart = storage.get_cart(request.user)
         
         # Check if coupon exists
         try:
@@ -181,15 +261,19 @@ class ApplyCouponAPIView(APIView):
             )
         
         # Apply coupon to cart
-        cart.applied_coupon = coupon
-        cart.save()
+        storage.set_coupon(cart, coupon)
         
         # Calculate discount
         discount = coupon.calculate_discount(cart.total_amount)
-        
-        serializer = CartSerializer(cart)
+        message = f"Coupon applied! You saved ₹{discount}"
+
+        if wants_delta(request):
+            return delta_response(request, storage, cart, [], message)
+
+        storage.refresh_version(cart)
+        serializer = CartSerializer(cart, context={'request': request})
         return Response({
-            "message": f"Coupon applied! You saved ₹{discount}",
+            "message": message,
             "cart": serializer.data
         }, status=status.HTTP_200_OK)
 
@@ -197,7 +281,8 @@ class RemoveCouponAPIView(APIView):
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
-        cart = get_or_create_cart(request.user)
+        storage = get_cart_storage()
+        cart = storage.get_cart(request.user)
         
         if not cart.applied_coupon:
             return Response(
@@ -205,17 +290,20 @@ class RemoveCouponAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        cart.applied_coupon = None
-        cart.save()
-        
-        serializer = CartSerializer(cart)
+        storage.set_coupon(cart, None)
+
+        if wants_delta(request):
+            return delta_response(request, storage, cart, [], "Coupon removed successfully")
+
+        storage.refresh_version(cart)
+        serializer = CartSerializer(cart, context={'request': request})
         return Response({
             "message": "Coupon removed successfully",
             "cart": serializer.data
         }, status=status.HTTP_200_OK)
 
-class UpdateItemInstructionsAPIView(APIView):
-    permission_classes = [IsAuthenticated]
+class UpdateItemInstructionsAPIView(GuestCartMixin, APIView):
+    permission_classes = [AllowAny]
 
     def post(self, request):
         juice_id = request.data.get('juice_id')
@@ -227,31 +315,165 @@ class UpdateItemInstructionsAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        cart = Cart.objects.filter(user=request.user, is_active=True).first()
+        try:
+            juice_id = int(juice_id)
+        except (TypeError, ValueError):
+            return Response(
+                {"message": "Invalid juice_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        storage, cart = request_cart(request, create=False)
         if not cart:
             return Response(
                 {"message": "Cart not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        try:
-            item = CartItem.objects.get(cart=cart, juice_id=juice_id)
-            # Truncate if too long (backup check)
-            if len(instructions) > 200:
-                instructions = instructions[:200]
-            
-            item.cooking_instructions = instructions
-            item.save()
-            
-            return Response(
-                {
-                    "message": "Instructions updated",
-                    "instructions": item.cooking_instructions
-                },
-                status=status.HTTP_200_OK
-            )
-        except CartItem.DoesNotExist:
+        # Truncate if too long (backup check)
+        if len(instructions) > 200:
+            instructions = instructions[:200]
+
+        if not storage.set_instructions(cart, juice_id, instructions):
             return Response(
                 {"message": "Item not in cart"},
                 status=status.HTTP_404_NOT_FOUND
             )
+
+        if wants_delta(request):
+            return delta_response(request, storage, cart, [juice_id], "Instructions updated")
+
+        return Response(
+            {
+                "message": "Instructions updated",
+                "instructions": instructions
+            },
+            status=status.HTTP_200_OK
+        )
+
+class BatchCartAPIView(GuestCartMixin, APIView):
+    """
+    Apply an ordered list of cart operations in one request:
+        {"operations": [
+            {"op": "add", "juice_id": 1, "quantity": 2},
+            {"op": "set_quantity", "juice_id": 1, "quantity": 3},
+            {"op": "increment", "juice_id": 1},
+            {"op": "decrement", "juice_id": 1},
+            {"op": "remove", "juice_id": 1},
+            {"op": "set_instructions", "juice_id": 1, "instructions": "less ice"}
+        ], "branch_id": 2}
+    Operations see the result of the ones before them. Either all of them
+    are applied or, if any is invalid, none is. Returns the priced cart, or
+    only the changed lines and totals with ?delta=true.
+    """
+    permission_classes = [AllowAny]
+    OPERATIONS = ('add', 'set_quantity', 'increment', 'decrement', 'remove', 'set_instructions')
+    MAX_OPERATIONS = 100
+
+    def error(self, message, index=None, status_code=status.HTTP_400_BAD_REQUEST):
+        body = {"message": message}
+        if index is not None:
+            body["operation"] = index
+        return Response(body, status=status_code)
+
+    def post(self, request):
+        operations = request.data.get('operations')
+        if not isinstance(operations, list) or not operations:
+            return self.error("operations must be a non-empty list")
+        if len(operations) > self.MAX_OPERATIONS:
+            return self.error(f"At most {self.MAX_OPERATIONS} operations per batch")
+
+        # Validate the shape of every operation before touching the database
+        for index, operation in enumerate(operations):
+            if not isinstance(operation, dict) or operation.get('op') not in self.OPERATIONS:
+                return self.error(f"op must be one of: {', '.join(self.OPERATIONS)}", index)
+            if not is_integer(operation.get('juice_id')):
+                return self.error("juice_id must be an integer", index)
+            if operation['op'] in ('add', 'set_quantity'):
+                quantity = operation.get('quantity', 1 if operation['op'] == 'add' else None)
+                minimum = 1 if operation['op'] == 'add' else 0
+                if not is_integer(quantity) or quantity < minimum:
+                    return self.error(f"quantity must be an integer of at least {minimum}", index)
+            if operation['op'] == 'set_instructions' and not isinstance(operation.get('instructions', ''), str):
+                return self.error("instructions must be a string", index)
+
+        branch_id = request.data.get('branch_id')
+        if branch_id is not None and not is_integer(branch_id):
+            return self.error("Invalid branch_id")
+
+        # One query for every juice an operation may add
+        adding = {op['juice_id'] for op in operations if op['op'] in ('add', 'set_quantity')}
+        juices = Juice.objects.filter(is_active=True).in_bulk(adding)
+
+        storage, cart = request_cart(request)
+
+        with storage.edit(cart, {op['juice_id'] for op in operations}) as existing:
+            items = dict(existing)
+            changed = set()
+
+            for index, operation in enumerate(operations):
+                op, juice_id = operation['op'], operation['juice_id']
+                item = items.get(juice_id)
+
+                # Adding to a line already in the cart is checked like a new line
+                if op == 'add' or (op == 'set_quantity' and item is None):
+                    if op == 'set_quantity' and operation['quantity'] == 0:
+                        continue
+                    juice = juices.get(juice_id)
+                    if juice is None:
+                        return self.error("Juice not found", index, status.HTTP_404_NOT_FOUND)
+                    if branch_id and not availability_index.is_available(branch_id, juice_id):
+                        return self.error(f"{juice.name} is not available at the selected branch", index)
+                    if item is None:
+                        if juice_id in existing:
+                            # Removed earlier in this batch; re-add the same row
+                            item = existing[juice_id]
+                            item.quantity, item.cooking_instructions = 0, ''
+                        else:
+                            item = CartItem(
+                                cart=cart,
+                                juice=juice,
+                                quantity=0,
+                                price_at_added=juice.price
+                            )
+                        items[juice_id] = item
+
+                if item is None:
+                    if op == 'remove':
+                        continue  # removing twice is harmless
+                    return self.error("Item not in cart", index, status.HTTP_404_NOT_FOUND)
+
+                if op == 'add':
+                    item.quantity += operation.get('quantity', 1)
+                elif op == 'set_quantity':
+                    item.quantity = operation['quantity']
+                elif op == 'increment':
+                    item.quantity += 1
+                elif op == 'decrement':
+                    item.quantity -= 1
+                elif op == 'remove':
+                    item.quantity = 0
+                elif op == 'set_instructions':
+                    item.cooking_instructions = operation.get('instructions', '')[:200]
+
+                changed.add(juice_id)
+                if item.quantity <= 0:
+                    del items[juice_id]
+
+            # Persist the net effect: one INSERT, one UPDATE, one DELETE at most
+            storage.write_lines(
+                cart,
+                created=[items[j] for j in changed if j in items and j not in existing],
+                updated=[items[j] for j in changed if j in items and j in existing],
+                deleted=[j for j in changed if j in existing and j not in items]
+            )
+
+        message = f"{len(operations)} operation(s) applied"
+        if wants_delta(request):
+            return delta_response(request, storage, cart, sorted(changed), message)
+
+        storage.refresh_version(cart)
+        return Response({
+            "message": message,
+            "cart": CartSerializer(cart, context={'request': request}).data
+        }, status=status.HTTP_200_OK)
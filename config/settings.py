@@ -128,6 +128,37 @@ DATABASES = {
         conn_health_checks=True,
     )
 }
+
+# Cache
+# Local memory by default; point CACHE_BACKEND/CACHE_LOCATION at a shared
+# backend (file, database, redis) when running more than one worker so that
+# catalog versions are seen by every process.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='peelojuice'),
+    }
+}
+
+# Seconds a cached catalog response is kept for a given catalog version
+CATALOG_CACHE_TIMEOUT = config('CATALOG_CACHE_TIMEOUT', default=60 * 60, cast=int)
+# With a per-process cache (LocMemCache), catalog changes made by other
+# processes are not seen; the catalog version then expires after this many
+# seconds so cached responses and in-memory indexes are reloaded anyway.
+# Configure a shared cache (CACHE_BACKEND) when running several processes.
+CATALOG_LOCAL_VERSION_TIMEOUT = config('CATALOG_LOCAL_VERSION_TIMEOUT', default=60, cast=int)
+
+# Where live carts are kept: 'cart.storage.DatabaseCartStorage' or
+# 'cart.storage.CachedCartStorage' (needs a cache shared by every worker)
+CART_STORAGE_BACKEND = config('CART_STORAGE_BACKEND', default='cart.storage.DatabaseCartStorage')
+# Cached carts are written back to the database at most this often (0 = on every change)
+CART_WRITE_BEHIND_SECONDS = config('CART_WRITE_BEHIND_SECONDS', default=30, cast=int)
+
+# Deliver outbox messages (order emails, staff push notifications) from the
+# web process after each order. Turn off once a `process_outbox` worker runs
+# (Procfile `worker`, railway.worker.json).
+OUTBOX_DRAIN_IN_WEB = config('OUTBOX_DRAIN_IN_WEB', default=True, cast=bool)
+
 AUTH_USER_MODEL = 'users.User'
 AUTHENTICATION_BACKENDS = [
     # 'users.auth_backend.EmailPhoneAuthBackend',
@@ -201,8 +232,12 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
+    'x-guest-cart',
 ]
 
+# Guest cart token (see cart/guest.py) readable by the frontend
+CORS_EXPOSE_HEADERS = ['x-guest-cart']
+
 CORS_ALLOW_METHODS = [
     'DELETE',
     'GET',
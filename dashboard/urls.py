@@ -7,6 +7,7 @@ urlpatterns = [
     
     # Products
     path('products/', views.product_list, name='dashboard_products'),
+    path('products/availability/', views.product_availability_matrix, name='dashboard_product_availability_matrix'),
     path('products/add/', views.product_add, name='dashboard_product_add'),
     path('products/<int:pk>/edit/', views.product_edit, name='dashboard_product_edit'),
     path('products/<int:pk>/toggle/', views.product_toggle_status, name='dashboard_product_toggle'),
@@ -2,6 +2,7 @@
 from .home import dashboard_home
 from .products import (
     product_list,
+    product_availability_matrix,
     product_add,
     product_edit,
     product_toggle_status,
@@ -23,6 +24,7 @@ __all__ = [
     'dashboard_home',
     # Products
     'product_list',
+    'product_availability_matrix',
     'product_add',
     'product_edit',
     'product_toggle_status',
@@ -6,6 +6,7 @@ from datetime import timedelta
 from dashboard.decorators import superuser_required
 from products.models import Juice, Category
 from orders.models import Order
+from orders.sales import top_selling_juices
 from users.models import User
 
 
@@ -32,9 +33,18 @@ def dashboard_home(request):
         status__in=['delivered', 'confirmed']
     ).aggregate(Sum('total_amount'))['total_amount__sum'] or 0
     
-    # Recent orders and products
+    # Recent orders
     recent_orders = Order.objects.select_related('user').order_by('-created_at')[:10]
-    popular_products = Juice.objects.filter(is_active=True).order_by('-id')[:10]
+    
+    # Top sellers over the last 30 days, read from the sales counters
+    top_sellers = top_selling_juices(days=30, limit=10)
+    juices = Juice.objects.select_related('category').in_bulk([juice_id for juice_id, _ in top_sellers])
+    popular_products = []
+    for juice_id, units_sold in top_sellers:
+        if juice_id in juices:
+            juice = juices[juice_id]
+            juice.units_sold = units_sold
+            popular_products.append(juice)
     low_stock_products = []
     
     context = {
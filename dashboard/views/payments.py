@@ -4,6 +4,7 @@ from django.core.paginator import Paginator
 from django.db.models import Sum
 
 from dashboard.decorators import superuser_required
+from orders.sales import record_payment_status_change
 from payments.models import Payment
 
 
@@ -67,8 +68,10 @@ def payment_update_status(request, payment_id):
                 payment.order.save()
                 messages.info(request, f'Order #{payment.order.id} automatically cancelled due to refund')
         
+        previous_status = payment.status
         payment.status = new_status
         payment.save()
+        record_payment_status_change(payment.order, previous_status, new_status)
         messages.success(request, f'Payment #{payment.id} status updated to {payment.get_status_display()}')
     
     return redirect('dashboard_payments')
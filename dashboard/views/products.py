@@ -1,6 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.core.paginator import Paginator
 from django.http import JsonResponse
 
@@ -59,38 +59,32 @@ def product_list(request):
             Q(description__icontains=search_query)
         )
     
+    # Branch availability as a single EXISTS per row instead of a query per product
+    if selected_branch:
+        products = products.annotate(
+            branch_available=Exists(
+                BranchProduct.objects.filter(
+                    branch=selected_branch,
+                    product=OuterRef('pk'),
+                    is_available=True
+                )
+            )
+        )
+    
     # Availability filter (filter by branch availability)
     availability_filter = request.GET.get('availability', '')
     if availability_filter and selected_branch:
         if availability_filter == 'available':
-            # Get products that are available in the selected branch
-            available_product_ids = BranchProduct.objects.filter(
-                branch=selected_branch,
-                is_available=True
-            ).values_list('product_id', flat=True)
-            products = products.filter(id__in=available_product_ids)
+            products = products.filter(branch_available=True)
         elif availability_filter == 'not_available':
-            # Get products that are not available or not in BranchProduct for this branch
-            available_product_ids = BranchProduct.objects.filter(
-                branch=selected_branch,
-                is_available=True
-            ).values_list('product_id', flat=True)
-            products = products.exclude(id__in=available_product_ids)
+            # Not available, or not in BranchProduct for this branch at all
+            products = products.filter(branch_available=False)
     
     # Pagination
     paginator = Paginator(products, 20)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     
-    # Add branch availability status to each product
-    if selected_branch:
-        for product in page_obj:
-            branch_product = BranchProduct.objects.filter(
-                branch=selected_branch,
-                product=product
-            ).first()
-            product.branch_available = branch_product.is_available if branch_product else False
-    
     categories = Category.objects.all()
     branches = Branch.objects.filter(is_active=True)
     
@@ -108,6 +102,63 @@ def product_list(request):
     return render(request, 'dashboard/products/list.html', context)
 
 
+@superuser_required
+def product_availability_matrix(request):
+    """Products × branches availability grid"""
+    
+    products = Juice.objects.select_related('category').order_by('id')
+    
+    # Category filter
+    category_filter = request.GET.get('category', '')
+    if category_filter:
+        products = products.filter(category_id=category_filter)
+    
+    # Search
+    search_query = request.GET.get('search', '')
+    if search_query:
+        products = products.filter(
+            Q(name__icontains=search_query) |
+            Q(description__icontains=search_query)
+        )
+    
+    # Pagination
+    paginator = Paginator(products, 20)
+    page_number = request.GET.get('page')
+    page_obj = paginator.get_page(page_number)
+    
+    branches = list(Branch.objects.filter(is_active=True))
+    
+    # Every (product, branch) cell of the page in one query
+    availability = {
+        (product_id, branch_id): is_available
+        for product_id, branch_id, is_available in BranchProduct.objects.filter(
+            product_id__in=[product.id for product in page_obj],
+            branch_id__in=[branch.id for branch in branches]
+        ).values_list('product_id', 'branch_id', 'is_available')
+    }
+    rows = [
+        {
+            'product': product,
+            'cells': [
+                {'branch': branch, 'is_available': availability.get((product.id, branch.id), False)}
+                for branch in branches
+            ]
+        }
+        for product in page_obj
+    ]
+    
+    context = {
+        'page_obj': page_obj,
+        'rows': rows,
+        'branches': branches,
+        'categories': Category.objects.all(),
+        'selected_category': category_filter,
+        'search_query': search_query,
+    }
+    
+    return render(request, 'dashboard/products/matrix.html', context)
+
+
 @superuser_required
 def product_add(request):
     """Add new product"""
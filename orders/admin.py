@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Order, OrderItem
+from django.utils import timezone
+from .models import Order, OrderItem, OutboxMessage
+from .sales import record_orders_cancelled
 
 
 class OrderItemInline(admin.TabularInline):
@@ -76,27 +78,33 @@ class OrderAdmin(admin.ModelAdmin):
     delivery_total_display.short_description = 'Delivery Total'
 
     def mark_as_confirmed(self, request, queryset):
-        updated = queryset.exclude(status__in=['cancelled', 'delivered']).update(status='confirmed')
+        updated = queryset.exclude(status__in=['cancelled', 'delivered']).update(status='confirmed', updated_at=timezone.now())
         self.message_user(request, f'{updated} order(s) marked as confirmed.')
     mark_as_confirmed.short_description = 'Mark selected as Confirmed'
 
     def mark_as_preparing(self, request, queryset):
-        updated = queryset.exclude(status__in=['cancelled', 'delivered']).update(status='preparing')
+        updated = queryset.exclude(status__in=['cancelled', 'delivered']).update(status='preparing', updated_at=timezone.now())
         self.message_user(request, f'{updated} order(s) marked as preparing.')
     mark_as_preparing.short_description = 'Mark selected as Preparing'
 
     def mark_as_out_for_delivery(self, request, queryset):
-        updated = queryset.exclude(status__in=['cancelled', 'delivered']).update(status='out_for_delivery')
+        updated = queryset.exclude(status__in=['cancelled', 'delivered']).update(status='out_for_delivery', updated_at=timezone.now())
         self.message_user(request, f'{updated} order(s) marked as out for delivery.')
     mark_as_out_for_delivery.short_description = 'Mark selected as Out for Delivery'
 
     def mark_as_delivered(self, request, queryset):
-        updated = queryset.exclude(status='cancelled').update(status='delivered')
+        updated = queryset.exclude(status='cancelled').update(status='delivered', updated_at=timezone.now())
         self.message_user(request, f'{updated} order(s) marked as delivered.')
     mark_as_delivered.short_description = 'Mark selected as Delivered'
 
     def mark_as_cancelled(self, request, queryset):
-        updated = queryset.exclude(status='delivered').update(status='cancelled')
+        # queryset.update() skips the Order signals and auto_now (which the
+        # order list ETags read), so adjust sales and updated_at here
+        order_ids = list(
+            queryset.exclude(status__in=['delivered', 'cancelled']).values_list('id', flat=True)
+        )
+        updated = Order.objects.filter(id__in=order_ids).update(status='cancelled', updated_at=timezone.now())
+        record_orders_cancelled(order_ids)
         self.message_user(request, f'{updated} order(s) marked as cancelled.')
     mark_as_cancelled.short_description = 'Mark selected as Cancelled'
 
@@ -104,3 +112,22 @@ class OrderAdmin(admin.ModelAdmin):
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('id', 'order', 'juice', 'quantity', 'price_per_item', 'subtotal')
     list_filter = ('juice',)
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'attempts', 'available_at', 'last_error', 'created_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('claimed_by', 'locked_until', 'created_at', 'processed_at')
+    actions = ['requeue']
+
+    def requeue(self, request, queryset):
+        updated = queryset.exclude(status='processing').update(
+            status='pending',
+            available_at=timezone.now(),
+            attempts=0,
+            last_error='',
+            claimed_by=''
+        )
+        self.message_user(request, f'{updated} message(s) requeued.')
+    requeue.short_description = 'Requeue selected messages'
@@ -0,0 +1,51 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from orders.outbox import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued order emails and push notifications from the outbox'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=4,
+            help='Messages delivered at the same time (default 4)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=50,
+            help='Messages claimed per round (default 50)'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=2.0,
+            help='Seconds to wait when the outbox is empty (default 2)'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Drain what is due now and exit instead of polling'
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while not self.stopping:
+            close_old_connections()
+            counts = process_batch(options['batch_size'], options['concurrency'])
+            if counts:
+                summary = ', '.join(f'{count} {status}' for status, count in sorted(counts.items()))
+                self.stdout.write(f'Outbox: {summary}')
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['poll_interval'])
+
+        self.stdout.write(self.style.SUCCESS('Outbox worker stopped'))
+
+    def stop(self, signum, frame):
+        # Finish the batch in hand, then exit
+        self.stopping = True
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.9 on 2026-10-18 20:16
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0008_order_history_indexes'),
+        ('products', '0007_juicerecommendation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyJuiceSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('quantity', models.IntegerField(default=0)),
+                ('branch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='juice_sales', to='products.branch')),
+                ('juice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.juice')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily juice sales',
+                'indexes': [models.Index(fields=['date', 'branch'], name='juice_sales_date_branch_idx')],
+                'unique_together': {('branch', 'juice', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.9 on 2026-10-18 20:30
+
+from django.db import migrations, models
+from django.db.models import Max
+
+# Keep in step with orders.numbering.BLOCK_SIZE / SEQUENCE_NAME
+BLOCK_SIZE = 10
+SEQUENCE_NAME = 'orders_order_number_seq'
+
+
+def start_allocators(apps, schema_editor):
+    """Continue numbering after the highest existing order number"""
+    Order = apps.get_model('orders', 'Order')
+    OrderNumberCounter = apps.get_model('orders', 'OrderNumberCounter')
+    last = Order.objects.aggregate(last=Max('order_number'))['last'] or 0
+    OrderNumberCounter.objects.update_or_create(pk=1, defaults={'last_number': last})
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f"CREATE SEQUENCE IF NOT EXISTS {SEQUENCE_NAME} "
+            f"INCREMENT BY {BLOCK_SIZE} START WITH {last + 1}"
+        )
+
+
+def drop_sequence(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f"DROP SEQUENCE IF EXISTS {SEQUENCE_NAME}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0009_dailyjuicesales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumberCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_number', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(start_allocators, drop_sequence),
+    ]
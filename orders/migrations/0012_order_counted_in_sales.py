@@ -0,0 +1,25 @@
+# Generated by Django 5.2.9 on 2026-10-18 20:45
+
+from django.db import migrations, models
+
+
+def mark_existing_orders(apps, schema_editor):
+    """Orders placed so far were all counted at checkout"""
+    Order = apps.get_model('orders', 'Order')
+    Order.objects.update(counted_in_sales=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0011_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='counted_in_sales',
+            field=models.BooleanField(default=False, editable=False, help_text='Whether the items are in the daily sales counters'),
+        ),
+        migrations.RunPython(mark_existing_orders, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from products.models import Juice
 from decimal import Decimal
 
@@ -98,9 +99,22 @@ class Order(models.Model):
         choices=STATUS_CHOICES,
         default='pending'
     )
+    # COD orders count as sold when placed, online orders once paid
+    counted_in_sales = models.BooleanField(
+        default=False,
+        editable=False,
+        help_text="Whether the items are in the daily sales counters"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination of order history (customer and branch views)
+            models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+            models.Index(fields=['branch', '-created_at', '-id'], name='order_branch_created_idx'),
+        ]
+
     @property
     def food_total(self):
         """Food cost + 5% GST"""
@@ -131,12 +145,8 @@ class Order(models.Model):
     def save(self, *args, **kwargs):
         """Override save to auto-assign sequential order number"""
         if not self.order_number:
-            # Get the highest order number and add 1
-            last_order = Order.objects.all().order_by('-order_number').first()
-            if last_order and last_order.order_number:
-                self.order_number = last_order.order_number + 1
-            else:
-                self.order_number = 1
+            from .numbering import order_numbers
+            self.order_number = order_numbers.allocate()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -175,3 +185,79 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.juice.name} x{self.quantity}"
+
+
+class DailyJuiceSales(models.Model):
+    """
+    Units of a juice sold by a branch on one day. Kept up to date as orders
+    are placed and cancelled (see orders/sales.py) so popularity rankings
+    read a few counter rows instead of aggregating OrderItem.
+    """
+    branch = models.ForeignKey(
+        'products.Branch',
+        on_delete=models.CASCADE,
+        related_name='juice_sales'
+    )
+    juice = models.ForeignKey(
+        Juice,
+        on_delete=models.CASCADE,
+        related_name='daily_sales'
+    )
+    date = models.DateField()
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('branch', 'juice', 'date')
+        indexes = [
+            models.Index(fields=['date', 'branch'], name='juice_sales_date_branch_idx'),
+        ]
+        verbose_name_plural = 'Daily juice sales'
+
+    def __str__(self):
+        return f"{self.juice.name} @ {self.branch.name} on {self.date}: {self.quantity}"
+
+
+class OrderNumberCounter(models.Model):
+    """
+    Highest order number handed out so far. Only used on databases without
+    sequences; on PostgreSQL order numbers come from a sequence (see
+    orders/numbering.py).
+    """
+    last_number = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"Order numbers up to {self.last_number}"
+
+
+class OutboxMessage(models.Model):
+    """
+    A side effect (email, push notification) recorded in the same
+    transaction as the change that causes it and carried out later by the
+    `process_outbox` worker (see orders/outbox.py).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('done', 'Done'),
+        ('dead', 'Dead'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    # Set while a worker holds the message; an expired lease is taken over
+    claimed_by = models.CharField(max_length=32, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='outbox_status_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
@@ -0,0 +1,61 @@
+"""
+Order number allocation.
+
+Each process reserves order numbers in blocks of BLOCK_SIZE and hands them
+out from memory, so numbering an order normally costs no query and never
+reads the orders table. On PostgreSQL a block is one nextval() on a
+sequence that steps by BLOCK_SIZE: it never waits on other checkouts and
+is not undone by a rollback, so blocks stay unique across workers and
+replicas. Other databases reserve blocks from the OrderNumberCounter row.
+
+Numbers are unique but only roughly in order across workers, and numbers
+left in a block when a worker stops are skipped.
+"""
+
+import threading
+
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import OrderNumberCounter
+
+# Must match the INCREMENT BY of the sequence (migration 0010)
+BLOCK_SIZE = 10
+SEQUENCE_NAME = 'orders_order_number_seq'
+
+
+class OrderNumberAllocator:
+    def __init__(self, block_size=BLOCK_SIZE):
+        self.block_size = block_size
+        self.next_number = self.end = 0     # current block is [next_number, end)
+        self.lock = threading.Lock()
+
+    def allocate(self):
+        with self.lock:
+            if self.next_number >= self.end:
+                self.next_number, self.end = self._reserve()
+            number = self.next_number
+            self.next_number += 1
+            return number
+
+    def _reserve(self):
+        """Reserve the next block and return it as (start, end)"""
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT nextval(%s)", [SEQUENCE_NAME])
+                start = cursor.fetchone()[0]
+            return start, start + self.block_size
+
+        # The counter row is rolled back with the caller's transaction, which
+        # would leave this process holding numbers another one can reserve.
+        # Inside a transaction, take one number and keep nothing back.
+        size = 1 if connection.in_atomic_block else self.block_size
+        with transaction.atomic():
+            counters = OrderNumberCounter.objects.filter(pk=1)
+            if not counters.update(last_number=F('last_number') + size):
+                OrderNumberCounter.objects.create(pk=1, last_number=size)
+            last = counters.values_list('last_number', flat=True).get()
+        return last - size + 1, last + 1
+
+
+order_numbers = OrderNumberAllocator()
@@ -0,0 +1,214 @@
+"""
+Transactional outbox for order side effects.
+
+Checkout and payment verification used to send the confirmation email and
+the staff push notifications inline, holding the request (and the checkout
+transaction) open across Brevo and Firebase calls. They now only insert
+OutboxMessage rows in their own transaction, so a message exists exactly
+when the order does, and the `process_outbox` worker delivers them:
+
+- claim a batch of due messages under a lease (SKIP LOCKED where the
+  database has it, a conditional UPDATE everywhere),
+- run each message's handler, several at a time,
+- retry failures with exponential backoff and move a message to 'dead'
+  after MAX_ATTEMPTS so it can be inspected and requeued from the admin.
+
+Delivery is at least once: a worker that dies mid-message leaves it to be
+taken over when its lease expires.
+
+Deployments without a worker process keep OUTBOX_DRAIN_IN_WEB on: every
+enqueue then also drains the due messages from a background thread of the
+web process once its transaction commits. Claiming works the same for
+both, so running the worker as well is safe.
+"""
+
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Order, OutboxMessage
+
+MAX_ATTEMPTS = 6
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 60 * 60
+LEASE_SECONDS = 5 * 60
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """Register the function that delivers messages of `kind`"""
+    def register(func):
+        HANDLERS[kind] = func
+        return func
+    return register
+
+
+class DeliveryFailed(Exception):
+    """Raised by a handler whose delivery call reported failure"""
+
+
+# ---------- enqueueing ----------
+
+def enqueue_order_notifications(order, email=True, notify_staff=True):
+    """
+    Queue the confirmation email for the customer and a push notification
+    for every staff member of the order's branch, in one INSERT.
+    """
+    messages = []
+    if email:
+        messages.append(OutboxMessage(kind='order_confirmation_email', payload={'order_id': order.id}))
+    if notify_staff and order.branch_id:
+        from users.models import User
+
+        # Active staff of the branch with a registered FCM token
+        tokens = User.objects.filter(
+            assigned_branch_id=order.branch_id,
+            is_staff=True,
+            is_active=True,
+            fcm_token__isnull=False
+        ).exclude(fcm_token='').values_list('fcm_token', flat=True)
+        messages.extend(
+            OutboxMessage(
+                kind='new_order_notification',
+                payload={'order_id': order.id, 'fcm_token': token}
+            )
+            for token in tokens
+        )
+    created = OutboxMessage.objects.bulk_create(messages)
+    if created and settings.OUTBOX_DRAIN_IN_WEB:
+        transaction.on_commit(start_drain)
+    return created
+
+
+# ---------- handlers ----------
+
+def _load_order(order_id):
+    return Order.objects.select_related('user', 'payment').prefetch_related('items').get(pk=order_id)
+
+
+@handler('order_confirmation_email')
+def send_confirmation_email(payload):
+    from .email_utils import send_order_confirmation_email
+
+    order = _load_order(payload['order_id'])
+    if not send_order_confirmation_email(order, order.user):
+        raise DeliveryFailed(f"confirmation email for order #{order.order_number} was not sent")
+
+
+@handler('new_order_notification')
+def send_staff_notification(payload):
+    from users.fcm_service import send_new_order_notification
+
+    order = _load_order(payload['order_id'])
+    if not send_new_order_notification(payload['fcm_token'], order):
+        raise DeliveryFailed(f"push notification for order #{order.order_number} was not sent")
+
+
+# ---------- processing ----------
+
+def _due(now):
+    return Q(status='pending', available_at__lte=now) | Q(status='processing', locked_until__lt=now)
+
+
+def claim(batch_size):
+    """Take up to batch_size due messages for this worker; returns them"""
+    now = timezone.now()
+    token = uuid.uuid4().hex
+    with transaction.atomic():
+        due = OutboxMessage.objects.filter(_due(now))
+        if connection.features.has_select_for_update_skip_locked:
+            due = due.select_for_update(skip_locked=True)
+        ids = list(due.order_by('available_at', 'id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return []
+        # Re-checking the due condition keeps two workers that read the same
+        # rows (no row locks on this database) from both claiming them
+        OutboxMessage.objects.filter(_due(now), id__in=ids).update(
+            status='processing',
+            claimed_by=token,
+            locked_until=now + timedelta(seconds=LEASE_SECONDS),
+            attempts=F('attempts') + 1
+        )
+    return list(OutboxMessage.objects.filter(claimed_by=token, status='processing'))
+
+
+def backoff(attempts):
+    """Seconds to wait before the next attempt, with jitter"""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def deliver(message):
+    """Run one claimed message and record the outcome; returns its status"""
+    try:
+        func = HANDLERS.get(message.kind)
+        if func is None:
+            raise DeliveryFailed(f"no handler for '{message.kind}'")
+        func(message.payload)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        if message.attempts >= MAX_ATTEMPTS:
+            changes = {'status': 'dead'}
+            print(f"[ERROR] Outbox message #{message.id} ({message.kind}) dead after {message.attempts} attempts: {error}")
+        else:
+            delay = backoff(message.attempts)
+            changes = {'status': 'pending', 'available_at': timezone.now() + timedelta(seconds=delay)}
+            print(f"[WARNING] Outbox message #{message.id} ({message.kind}) failed, retrying in {delay:.0f}s: {error}")
+        changes['last_error'] = error
+    else:
+        changes = {'status': 'done', 'processed_at': timezone.now()}
+
+    # Only the worker that still holds the message records the outcome
+    OutboxMessage.objects.filter(pk=message.pk, claimed_by=message.claimed_by).update(
+        claimed_by='', locked_until=None, **changes
+    )
+    return changes['status']
+
+
+def process_batch(batch_size=50, concurrency=4):
+    """Claim and deliver one batch; returns {status: count}"""
+    messages = claim(batch_size)
+    if not messages:
+        return {}
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            statuses = list(pool.map(_deliver_in_thread, messages))
+    else:
+        statuses = [deliver(message) for message in messages]
+    counts = {}
+    for status in statuses:
+        counts[status] = counts.get(status, 0) + 1
+    return counts
+
+
+def _deliver_in_thread(message):
+    try:
+        return deliver(message)
+    finally:
+        # Each worker thread opened its own connection
+        connection.close()
+
+
+# ---------- draining from the web process ----------
+
+def start_drain():
+    """Deliver due messages in a background thread of this process"""
+    threading.Thread(target=_drain, name='outbox-drain', daemon=True).start()
+
+
+def _drain():
+    try:
+        process_batch(concurrency=1)
+    except Exception as e:
+        # The worker or the next drain picks up whatever is left
+        print(f"[ERROR] Outbox drain failed: {e}")
+    finally:
+        connection.close()
@@ -0,0 +1,48 @@
+"""
+Query budgets for hot request paths.
+
+    @query_budget(20, 'checkout')
+    def post(self, request): ...
+
+counts the database queries run inside the block. Going over the budget
+raises QueryBudgetExceeded when DEBUG is on, so a change that brings back
+per-item queries fails in development, and only logs a warning otherwise.
+"""
+
+from contextlib import ContextDecorator
+
+from django.conf import settings
+from django.db import connection
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+class query_budget(ContextDecorator):
+    def __init__(self, limit, name):
+        self.limit = limit
+        self.name = name
+        self.count = 0
+
+    def _recreate_cm(self):
+        # A fresh counter for every decorated call
+        return type(self)(self.limit, self.name)
+
+    def _count(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self._count)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._wrapper.__exit__(exc_type, exc, tb)
+        if exc_type is None and self.count > self.limit:
+            message = f"{self.name} ran {self.count} queries (budget {self.limit})"
+            if settings.DEBUG:
+                raise QueryBudgetExceeded(message)
+            print(f"[WARNING] {message}")
+        return False
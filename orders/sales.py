@@ -0,0 +1,172 @@
+"""
+Incremental per-branch sales counters and popularity rankings.
+
+Every sold order adds its item quantities to DailyJuiceSales rows keyed by
+(branch, juice, day); a cancellation subtracts them again. COD orders are
+sold when placed, online orders when their payment completes, and
+Order.counted_in_sales records which orders are in the counters. Rolling 7 and 30
+day rankings sum at most that many rows per juice and are cached under a
+popularity version that every counter change bumps, the same way catalog
+responses are keyed by the catalog version.
+"""
+
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.utils import timezone
+
+from .models import DailyJuiceSales, Order, OrderItem
+
+# ?sort= value -> rolling window in days
+POPULARITY_WINDOWS = {
+    'popular': 7,
+    'popular_30d': 30,
+}
+
+POPULARITY_VERSION_KEY = 'popularity:version'
+POPULARITY_CACHE_TIMEOUT = 60 * 15
+
+
+def get_popularity_version():
+    version = cache.get(POPULARITY_VERSION_KEY)
+    if version is None:
+        cache.add(POPULARITY_VERSION_KEY, int(time.time() * 1000), timeout=None)
+        version = cache.get(POPULARITY_VERSION_KEY)
+    return version
+
+
+def bump_popularity_version():
+    try:
+        return cache.incr(POPULARITY_VERSION_KEY)
+    except ValueError:
+        get_popularity_version()
+        return cache.incr(POPULARITY_VERSION_KEY)
+
+
+def _apply(deltas):
+    """
+    Add {(branch id, date, juice id): quantity} to the counters: one INSERT
+    for missing rows and one UPDATE per (branch, day).
+    """
+    deltas = {key: quantity for key, quantity in deltas.items() if quantity}
+    if not deltas:
+        return
+
+    DailyJuiceSales.objects.bulk_create(
+        [
+            DailyJuiceSales(branch_id=branch_id, date=date, juice_id=juice_id)
+            for branch_id, date, juice_id in deltas
+        ],
+        ignore_conflicts=True
+    )
+
+    per_day = defaultdict(dict)
+    for (branch_id, date, juice_id), quantity in deltas.items():
+        per_day[branch_id, date][juice_id] = quantity
+    for (branch_id, date), quantities in per_day.items():
+        DailyJuiceSales.objects.filter(
+            branch_id=branch_id,
+            date=date,
+            juice_id__in=quantities
+        ).update(quantity=F('quantity') + Case(
+            *[When(juice_id=juice_id, then=Value(quantity)) for juice_id, quantity in quantities.items()],
+            default=Value(0),
+            output_field=IntegerField()
+        ))
+
+    transaction.on_commit(bump_popularity_version)
+
+
+def record_order_sales(order, items=None, sign=1):
+    """
+    Count an order's items towards its branch's sales for the day it was
+    placed (sign=-1 takes them back out). `items` is an iterable of
+    (juice id, quantity) and is read from the order when omitted.
+    """
+    if not order.branch_id:
+        return
+    if items is None:
+        items = order.items.values_list('juice_id', 'quantity')
+    date = timezone.localdate(order.created_at)
+    deltas = defaultdict(int)
+    for juice_id, quantity in items:
+        deltas[order.branch_id, date, juice_id] += sign * quantity
+    _apply(deltas)
+
+
+def record_paid_order(order):
+    """
+    Count an online order once its payment completes. The conditional
+    UPDATE makes a second confirmation (the verify call and the webhook)
+    a no-op, as is paying for a COD order, which was counted when placed.
+    """
+    counted = Order.objects.filter(
+        pk=order.pk,
+        counted_in_sales=False
+    ).exclude(status='cancelled').update(counted_in_sales=True)
+    if counted:
+        order.counted_in_sales = True
+        record_order_sales(order)
+    return bool(counted)
+
+
+def record_payment_reversed(order):
+    """
+    Take an order back out of the counters when its completed payment fails
+    or is refunded; completing it again counts it again. A cancelled order
+    was already taken out when it was cancelled.
+    """
+    uncounted = Order.objects.filter(pk=order.pk, counted_in_sales=True).update(counted_in_sales=False)
+    if uncounted:
+        order.counted_in_sales = False
+        if order.status != 'cancelled':
+            record_order_sales(order, sign=-1)
+    return bool(uncounted)
+
+
+def record_payment_status_change(order, previous_status, status):
+    """Count or uncount `order` when its payment moves into or out of completed"""
+    if status == previous_status:
+        return
+    if status == 'completed':
+        record_paid_order(order)
+    elif previous_status == 'completed':
+        record_payment_reversed(order)
+
+
+def record_orders_cancelled(order_ids):
+    """Take several orders back out of the counters with one item query"""
+    deltas = defaultdict(int)
+    for branch_id, created_at, juice_id, quantity in OrderItem.objects.filter(
+        order_id__in=order_ids,
+        order__branch__isnull=False,
+        order__counted_in_sales=True
+    ).values_list('order__branch_id', 'order__created_at', 'juice_id', 'quantity'):
+        deltas[branch_id, timezone.localdate(created_at), juice_id] -= quantity
+    _apply(deltas)
+
+
+def top_selling_juices(branch_id=None, days=7, limit=None):
+    """[(juice id, units sold)] over the last `days` days, best sellers first"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    rows = DailyJuiceSales.objects.filter(date__gte=since)
+    if branch_id is not None:
+        rows = rows.filter(branch_id=branch_id)
+    rows = rows.values('juice_id').annotate(sold=Sum('quantity')).filter(sold__gt=0).order_by('-sold', 'juice_id')
+    if limit:
+        rows = rows[:limit]
+    return [(row['juice_id'], row['sold']) for row in rows]
+
+
+def popular_juice_ids(branch_id=None, days=7):
+    """Cached best-seller ranking as a list of juice ids"""
+    key = f"popularity:{get_popularity_version()}:{branch_id or 'all'}:{days}"
+    ranking = cache.get(key)
+    if ranking is None:
+        ranking = [juice_id for juice_id, _ in top_selling_juices(branch_id, days)]
+        cache.set(key, ranking, POPULARITY_CACHE_TIMEOUT)
+    return ranking
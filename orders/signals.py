@@ -0,0 +1,24 @@
+from django.db.models.signals import post_init, post_save
+from django.dispatch import receiver
+
+from .models import Order
+from .sales import record_order_sales
+
+
+@receiver(post_init, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    # Read from __dict__ so a deferred status field is not loaded
+    instance._saved_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Order)
+def update_sales_on_cancellation(sender, instance, created, **kwargs):
+    """Cancelling an order takes its items out of the sales counters"""
+    previous = instance._saved_status
+    instance._saved_status = instance.status
+    if created or previous is None or previous == instance.status or not instance.counted_in_sales:
+        return
+    if instance.status == 'cancelled':
+        record_order_sales(instance, sign=-1)
+    elif previous == 'cancelled':
+        record_order_sales(instance)
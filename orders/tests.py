@@ -1,3 +1,74 @@
-from django.test import TestCase
+from datetime import time
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from addresses.models import Address
+from products.models import Branch, BranchProduct, Category, Juice
+from users.models import User
+
+from .query_budget import QueryBudgetExceeded, query_budget
+
+CART_STORAGE_BACKENDS = (
+    'cart.storage.DatabaseCartStorage',
+    'cart.storage.CachedCartStorage',
+)
+
+
+class CheckoutQueryBudgetTests(TestCase):
+    """Checkout stays within CheckoutAPIView.QUERY_BUDGET on every cart storage"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Juices')
+        cls.branch = Branch.objects.create(
+            name='Main', address='a', city='Vijayawada', state='AP', pincode='520010',
+            phone='1', email='b@example.com', opening_time=time(0, 0), closing_time=time(23, 59)
+        )
+        cls.juices = [
+            Juice.objects.create(
+                category=category, name=f'Juice {i}', description='d',
+                price=Decimal(50 + i), image=f'juices/j{i}.png'
+            )
+            for i in range(20)
+        ]
+        BranchProduct.objects.bulk_create(
+            [BranchProduct(branch=cls.branch, product=juice) for juice in cls.juices]
+        )
+        cls.user = User.objects.create_user(email='u@example.com', phone_number='999', password='pw')
+        cls.address = Address.objects.create(
+            user=cls.user, label='Home', full_name='U', phone_number='999',
+            address_line1='a', city='Vijayawada', state='AP', pincode='520010'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def checkout(self, lines):
+        for juice in self.juices[:lines]:
+            self.client.post('/api/cart/add/', {'juice_id': juice.id, 'quantity': 2}, format='json')
+        return self.client.post(
+            '/api/orders/checkout/',
+            {'branch_id': self.branch.id, 'address_id': self.address.id},
+            format='json'
+        )
+
+    def test_checkout_within_budget_on_each_cart_storage(self):
+        # With DEBUG on, going over the budget raises QueryBudgetExceeded
+        for backend in CART_STORAGE_BACKENDS:
+            for lines in (1, len(self.juices)):
+                with self.subTest(backend=backend, lines=lines), \
+                        override_settings(CART_STORAGE_BACKEND=backend, DEBUG=True):
+                    response = self.checkout(lines)
+                    self.assertEqual(response.status_code, 201, response.data)
+                    self.assertEqual(len(response.data['order']['items']), lines)
+
+    def test_going_over_budget_raises_in_debug(self):
+        with override_settings(DEBUG=True), self.assertRaises(QueryBudgetExceeded):
+            with query_budget(1, 'test'):
+                list(Juice.objects.all())
+                list(Branch.objects.all())
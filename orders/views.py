@@ -3,22 +3,104 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from rest_framework.generics import RetrieveAPIView
-from decimal import Decimal
 
-from cart.models import Cart, CartItem
+from cart.models import CartItem
+from cart.storage import get_cart_storage
+from cart.pricing import CartPricing, delivery_zone
+from products.availability import availability_index
+from products.pagination import CountableCursorPagination
 from .models import Order, OrderItem
+from .query_budget import query_budget
+from .sales import record_order_sales
 from .serializers import OrderSerializer, MyOrderListSerializer, OrderDetailSerializer
-from .email_utils import send_order_confirmation_email
+from .outbox import enqueue_order_notifications
+
+class OrderCursorPagination(CountableCursorPagination):
+    ordering = ('-created_at', '-id')
+
+
+def _paginate_orders(request, orders):
+    """
+    Return (orders page, paginator) when the client asked for cursor
+    pagination with ?cursor= or ?page_size=, else (orders, None) so the full
+    list keeps working for older app builds.
+    """
+    if 'cursor' not in request.query_params and 'page_size' not in request.query_params:
+        return orders, None
+    paginator = OrderCursorPagination()
+    return paginator.paginate_queryset(orders, request), paginator
+
+
+def _orders_response_data(orders, paginator):
+    serializer = MyOrderListSerializer(orders, many=True)
+    if paginator is None:
+        return {"count": orders.count(), "orders": serializer.data}
+    data = {
+        "next": paginator.get_next_link(),
+        "previous": paginator.get_previous_link(),
+        "orders": serializer.data,
+    }
+    if paginator.total is not None:
+        data["count"] = paginator.total
+    return data
+
+
+def _orders_etag(prefix, orders):
+    """
+    ETag from the order count and latest order/payment change, computed in one
+    aggregate query instead of serializing the list.
+    """
+    state = orders.aggregate(
+        count=Count('id'),
+        order_updated=Max('updated_at'),
+        payment_updated=Max('payment__updated_at'),
+    )
+    stamps = [
+        int(state[field].timestamp() * 1000000) if state[field] else 0
+        for field in ('order_updated', 'payment_updated')
+    ]
+    return f"{prefix}-{state['count']}-{stamps[0]}-{stamps[1]}"
+
+
+def my_orders_etag(request, *args, **kwargs):
+    return _orders_etag(f"orders-{request.user.id}", Order.objects.filter(user=request.user))
+
+
+def staff_orders_etag(request, *args, **kwargs):
+    user = request.user
+    if not user.is_staff or not user.assigned_branch_id:
+        return None
+    return _orders_etag(
+        f"branch-orders-{user.assigned_branch_id}",
+        Order.objects.filter(branch_id=user.assigned_branch_id)
+    )
+
+
+def _prefetched(queryset, objects):
+    """A queryset that yields `objects` without querying, for a prefetch cache"""
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    return queryset
+
 
 class CheckoutAPIView(APIView):
+    """
+    Place an order from the cart. The cart lines are loaded once with their
+    juices, priced before the single Order INSERT, and written as order
+    lines with one bulk INSERT, so the number of queries does not grow with
+    the size of the cart (enforced by QUERY_BUDGET). Fetching the cart and
+    writing back a cached one are up to the cart storage backend and are
+    not counted.
+    """
     permission_classes = [IsAuthenticated]
+    QUERY_BUDGET = 21
 
     @transaction.atomic
     def post(self, request):
-        from payments.models import Payment
-        from addresses.models import Address
-        
         user = request.user
         payment_method = request.data.get('payment_method', 'cod')
         branch_id = request.data.get('branch_id')
@@ -44,36 +126,32 @@ class CheckoutAPIView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            cart = Cart.objects.get(user=user)
-        except Cart.DoesNotExist:
+        cart_storage = get_cart_storage()
+        cart = cart_storage.get_cart(user, create=False)
+        if cart is None:
             return Response(
                 {"detail": "Cart not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        # Write back a cached cart so the order is built from its rows
+        cart_storage.flush(cart)
+
+        return self.place_order(request, cart_storage, cart, payment_method, branch_id, address_id)
 
-        cart_items = CartItem.objects.filter(cart=cart)
+    @query_budget(QUERY_BUDGET, 'checkout')
+    def place_order(self, request, cart_storage, cart, payment_method, branch_id, address_id):
+        from payments.models import Payment
+        from addresses.models import Address
+
+        user = request.user
+        cart_items = list(CartItem.objects.filter(cart=cart).select_related('juice'))
 
-        if not cart_items.exists():
+        if not cart_items:
             return Response(
                 {"detail": "Cart is empty"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Calculate subtotal using price_at_added (cart prices)
-        food_subtotal = sum(
-            item.price_at_added * item.quantity for item in cart_items
-        )
-        
-        # Calculate coupon discount if applied
-        discount = 0
-        if cart.applied_coupon is not None:
-            try:
-                discount = cart.applied_coupon.calculate_discount(food_subtotal)
-            except Exception as e:
-                print(f"[ERROR] Coupon discount calculation failed: {str(e)}")
-                discount = 0
-
         # Get the selected branch from request
         from products.models import Branch
         try:
@@ -91,6 +169,24 @@ class CheckoutAPIView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+        # Every cart line must be orderable at the selected branch
+        unavailable_ids = set(availability_index.unavailable(
+            branch.id, [item.juice_id for item in cart_items]
+        ))
+        if unavailable_ids:
+            unavailable_items = [
+                {"juice_id": item.juice_id, "name": item.juice.name}
+                for item in cart_items if item.juice_id in unavailable_ids
+            ]
+            return Response(
+                {
+                    "detail": f"Some items are not available at {branch.name}: "
+                              f"{', '.join(item['name'] for item in unavailable_items)}",
+                    "unavailable_items": unavailable_items
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         # Get the selected address
         try:
             address = Address.objects.get(id=address_id, user=user)
@@ -100,26 +196,16 @@ class CheckoutAPIView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        # Validate Delivery Zone and Calculate Fee
-        CORE_PINCODES = ['520010', '520008', '520004', '520002']
-        SECONDARY_PINCODES = ['520003', '520007', '520001', '520013', '520011', '521137']
-        
+        # Validate Delivery Zone
         pincode = address.pincode.strip() if address.pincode else ''
-        delivery_fee_base = Decimal('20.00')
-        
-        if pincode in CORE_PINCODES:
-            delivery_fee_base = Decimal('20.00')
-        elif pincode in SECONDARY_PINCODES:
-            delivery_fee_base = Decimal('40.00')
-        else:
+        if delivery_zone(pincode) is None:
             return Response(
                 {"detail": f"Sorry, we do not deliver to pincode {pincode} yet."},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        # Free delivery check
-        if food_subtotal >= Decimal('99.00'):
-            delivery_fee_base = Decimal('0.00')
+        # Price with the same engine that quoted the cart
+        pricing = CartPricing(cart, items=cart_items, pincode=pincode)
 
         # Create order
         try:
@@ -127,12 +213,16 @@ class CheckoutAPIView(APIView):
                 user=user,
                 branch=branch,
                 address=address,
-                food_subtotal=food_subtotal,
-                delivery_fee_base=delivery_fee_base,
-                platform_fee=10,
-                discount=discount
-            )
-            print(f"[SUCCESS] Order created: ID={order.id}, Branch={branch.name}, Fee={delivery_fee_base}")
+                food_subtotal=pricing.subtotal,
+                food_gst=pricing.food_gst,
+                delivery_fee_base=pricing.delivery_fee_base,
+                delivery_gst=pricing.delivery_gst,
+                platform_fee=pricing.platform_fee,
+                discount=pricing.discount,
+                total_amount=pricing.grand_total,
+                counted_in_sales=payment_method == 'cod'
+            )
+            print(f"[SUCCESS] Order created: ID={order.id}, Branch={branch.name}, Fee={pricing.delivery_fee_base}")
         except Exception as e:
             print(f"[ERROR] Order creation failed: {str(e)}")
             import traceback
@@ -144,15 +234,22 @@ class CheckoutAPIView(APIView):
 
         # Create order items
         try:
-            for item in cart_items:
-                OrderItem.objects.create(
+            order_items = OrderItem.objects.bulk_create([
+                OrderItem(
                     order=order,
                     juice=item.juice,
                     quantity=item.quantity,
                     price_per_item=item.price_at_added,
                     cooking_instructions=item.cooking_instructions
                 )
-            print(f"[SUCCESS] Created {cart_items.count()} order items")
+                for item in cart_items
+            ])
+            # The email and the response read the lines we just wrote
+            order._prefetched_objects_cache = {'items': _prefetched(order.items.all(), order_items)}
+            # Online orders are counted when their payment is verified
+            if order.counted_in_sales:
+                record_order_sales(order, items=[(item.juice_id, item.quantity) for item in cart_items])
+            print(f"[SUCCESS] Created {len(order_items)} order items")
         except Exception as e:
             print(f"[ERROR] Order items creation failed: {str(e)}")
             import traceback
@@ -162,21 +259,7 @@ class CheckoutAPIView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-        # Calculate totals
-        try:
-            order.calculate_totals()
-            order.save()
-            print(f"[SUCCESS] Order totals calculated: Rs.{order.total_amount}")
-        except Exception as e:
-            print(f"[ERROR] Total calculation failed: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return Response(
-                {"detail": f"Total calculation error: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-
-        # Create payment
+        # Create payment (also caches order.payment for the email)
         try:
             Payment.objects.create(
                 order=order,
@@ -198,54 +281,15 @@ class CheckoutAPIView(APIView):
         # For online payments, cart will be cleared after successful payment verification
         if payment_method == 'cod':
             try:
-                cart_items.delete()
-                cart.applied_coupon = None
-                cart.save()
+                cart_storage.clear(cart)
                 print(f"[SUCCESS] Cart cleared for COD order")
             except Exception as e:
                 print(f"[WARNING] Cart clearing failed: {str(e)}")
 
-        # Send order confirmation email (non-critical)
-        try:
-            email_sent = send_order_confirmation_email(order, user)
-            if email_sent:
-                print(f"[SUCCESS] Order confirmation email sent to {user.email}")
-            else:
-                print(f"[WARNING] Email sending returned False for order #{order.id}")
-        except Exception as e:
-            print(f"[WARNING] Email failed for order #{order.id}: {str(e)}")
-
-        # Send push notifications to branch staff
-        # Only send for COD orders - online payment orders will send after payment verification
-        if payment_method == 'cod':
-            try:
-                from users.fcm_service import send_new_order_notification
-                from users.models import User
-                
-                # Get all active staff members assigned to this branch with FCM tokens
-                branch_staff = User.objects.filter(
-                    assigned_branch=branch,
-                    is_staff=True,
-                    is_active=True,
-                    fcm_token__isnull=False  # Only staff with registered FCM tokens
-                ).exclude(fcm_token='')
-                
-                # Send notification to each staff member
-                notification_count = 0
-                for staff_member in branch_staff:
-                    if send_new_order_notification(staff_member.fcm_token, order):
-                        notification_count += 1
-                
-                if notification_count > 0:
-                    print(f"[SUCCESS] Sent notifications to {notification_count} staff members for order #{order.order_number}")
-                else:
-                    print(f"[WARNING] No staff notifications sent for order #{order.order_number} (no staff with FCM tokens)")
-                    
-            except Exception as e:
-                # Don't fail the order if notification fails
-                print(f"[ERROR] Failed to send notifications: {str(e)}")
-        else:
-            print(f"[INFO] Skipping staff notification for online payment order #{order.order_number} - will send after payment verification")
+        # Email the customer and, for COD, alert the branch staff once this
+        # transaction commits; online orders alert staff after payment
+        enqueue_order_notifications(order, notify_staff=payment_method == 'cod')
+        print(f"[SUCCESS] Queued notifications for order #{order.order_number}")
 
         # Serialize and return
         try:
@@ -265,6 +309,7 @@ class CheckoutAPIView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+@method_decorator(condition(etag_func=my_orders_etag), name='get')
 class MyOrdersAPIView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -272,7 +317,7 @@ class MyOrdersAPIView(APIView):
         user = request.user
         status_filter = request.query_params.get('status')
 
-        orders = Order.objects.filter(user=user).order_by('-created_at')
+        orders = Order.objects.filter(user=user).order_by('-created_at', '-id')
 
         if status_filter == 'ongoing':
             orders = orders.filter(
@@ -290,13 +335,10 @@ class MyOrdersAPIView(APIView):
         elif status_filter == 'cancelled':
             orders = orders.filter(status='cancelled')
 
-        serializer = MyOrderListSerializer(orders, many=True)
-
-        return Response({
-            "count": orders.count(),
-            "orders": serializer.data
-        })
+        orders, paginator = _paginate_orders(request, orders)
+        return Response(_orders_response_data(orders, paginator))
 
+@method_decorator(condition(etag_func=staff_orders_etag), name='get')
 class StaffOrdersAPIView(APIView):
     """
     REST API endpoint for staff to get orders assigned to their branch.
@@ -327,7 +369,7 @@ class StaffOrdersAPIView(APIView):
         # Get orders for this staff member's assigned branch
         orders = Order.objects.filter(
             branch=user.assigned_branch
-        ).order_by('-created_at')
+        ).order_by('-created_at', '-id')
         
         # Apply status filtering if provided
         if status_filter == 'ongoing':
@@ -347,11 +389,10 @@ class StaffOrdersAPIView(APIView):
             # If a specific status is provided
             orders = orders.filter(status=status_filter)
         
-        serializer = MyOrderListSerializer(orders, many=True)
+        orders, paginator = _paginate_orders(request, orders)
         
         return Response({
-            "count": orders.count(),
-            "orders": serializer.data,
+            **_orders_response_data(orders, paginator),
             "branch": {
                 "id": user.assigned_branch.id,
                 "name": user.assigned_branch.name,
@@ -1,4 +1,7 @@
 from django.contrib import admin
+from django.utils import timezone
+from orders.models import Order
+from orders.sales import record_paid_order, record_payment_status_change
 from .models import Payment
 
 
@@ -11,13 +14,24 @@ class PaymentAdmin(admin.ModelAdmin):
     list_editable = ('status',)
     actions = ['mark_as_completed', 'mark_as_failed']
 
+    def save_model(self, request, obj, form, change):
+        previous_status = form.initial.get('status') if change else None
+        super().save_model(request, obj, form, change)
+        record_payment_status_change(obj.order, previous_status, obj.status)
+
     def mark_as_completed(self, request, queryset):
-        from django.utils import timezone
-        updated = queryset.filter(status='pending').update(status='completed', paid_at=timezone.now())
+        pending = queryset.filter(status='pending')
+        order_ids = list(pending.values_list('order_id', flat=True))
+        now = timezone.now()
+        # update() skips auto_now, which the order list ETags read
+        updated = pending.update(status='completed', paid_at=now, updated_at=now)
+        # Paid online orders count towards sales
+        for order in Order.objects.filter(pk__in=order_ids):
+            record_paid_order(order)
         self.message_user(request, f'{updated} payment(s) marked as completed.')
     mark_as_completed.short_description = 'Mark selected as Completed'
 
     def mark_as_failed(self, request, queryset):
-        updated = queryset.filter(status='pending').update(status='failed')
+        updated = queryset.filter(status='pending').update(status='failed', updated_at=timezone.now())
         self.message_user(request, f'{updated} payment(s) marked as failed.')
     mark_as_failed.short_description = 'Mark selected as Failed'
@@ -2,6 +2,7 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
+from django.db import transaction
 from django.utils import timezone
 from django.conf import settings
 
@@ -188,65 +189,42 @@ class VerifyRazorpayPaymentAPIView(APIView):
                 payment.method = 'online'
                 print(f"[INFO] Converting COD order #{payment.order.order_number} payment to online")
             
-            payment.save()
+            # The payment, the order status and the queued notifications are
+            # committed together
+            with transaction.atomic():
+                payment.save()
             
-            # Update order status to confirmed after successful payment
-            # Only if order was pending (new order), not if already confirmed/preparing
-            if payment.order.status == 'pending':
-                payment.order.status = 'confirmed'
-                payment.order.save()
+                # Update order status to confirmed after successful payment
+                # Only if order was pending (new order), not if already confirmed/preparing
+                if payment.order.status == 'pending':
+                    payment.order.status = 'confirmed'
+                    payment.order.save()
+
+                # Online orders count towards sales once paid
+                from orders.sales import record_paid_order
+                record_paid_order(payment.order)
             
             
-            # Clear cart after successful online payment
-            # This ensures cart is only cleared when payment actually succeeds
-            from cart.models import Cart, CartItem
-            try:
-                cart = Cart.objects.get(user=request.user)
-                CartItem.objects.filter(cart=cart).delete()
-                cart.applied_coupon = None
-                cart.save()
-            except Cart.DoesNotExist:
-                pass  # Cart already cleared or doesn't exist
+                # Clear cart after successful online payment
+                # This ensures cart is only cleared when payment actually succeeds
+                from cart.storage import get_cart_storage
+                cart_storage = get_cart_storage()
+                cart = cart_storage.get_cart(request.user, create=False)
+                if cart is not None:
+                    cart_storage.clear(cart)
             
-            # Send push notifications to branch staff ONLY for NEW online payment orders
-            # Do NOT send notification if this is a "Pay Now" conversion from COD
-            # (Staff already received notification when COD order was created)
-            if not was_cod_order and original_order_status == 'pending':
-                try:
-                    from users.fcm_service import send_new_order_notification
-                    from users.models import User
-                    
-                    order = payment.order
-                    branch = order.branch
-                    
-                    if branch:
-                        # Get all active staff members assigned to this branch with FCM tokens
-                        branch_staff = User.objects.filter(
-                            assigned_branch=branch,
-                            is_staff=True,
-                            is_active=True,
-                            fcm_token__isnull=False
-                        ).exclude(fcm_token='')
-                        
-                        # Send notification to each staff member
-                        notification_count = 0
-                        for staff_member in branch_staff:
-                            if send_new_order_notification(staff_member.fcm_token, order):
-                                notification_count += 1
-                        
-                        if notification_count > 0:
-                            print(f"[SUCCESS] Sent notifications to {notification_count} staff members for NEW online payment order #{order.order_number}")
-                        else:
-                            print(f"[WARNING] No staff notifications sent for order #{order.order_number}")
-                            
-                except Exception as e:
-                    # Don't fail the payment verification if notification fails
-                    print(f"[ERROR] Failed to send notifications: {str(e)}")
-            else:
-                if was_cod_order:
-                    print(f"[INFO] Skipping notification for Pay Now conversion - order #{payment.order.order_number} already known to staff")
+                # Send push notifications to branch staff ONLY for NEW online payment orders
+                # Do NOT send notification if this is a "Pay Now" conversion from COD
+                # (Staff already received notification when COD order was created)
+                if not was_cod_order and original_order_status == 'pending':
+                    from orders.outbox import enqueue_order_notifications
+                    enqueue_order_notifications(payment.order, email=False)
+                    print(f"[SUCCESS] Queued staff notifications for NEW online payment order #{payment.order.order_number}")
                 else:
-                    print(f"[INFO] Skipping notification - order #{payment.order.order_number} status is {original_order_status}, not a new order")
+                    if was_cod_order:
+                        print(f"[INFO] Skipping notification for Pay Now conversion - order #{payment.order.order_number} already known to staff")
+                    else:
+                        print(f"[INFO] Skipping notification - order #{payment.order.order_number} status is {original_order_status}, not a new order")
 
             return Response(
                 {
@@ -301,7 +279,10 @@ class RazorpayWebhookAPIView(APIView):
                 payment.transaction_id = razorpay_payment_id
                 payment.status = 'completed'
                 payment.paid_at = timezone.now()
-                payment.save()
+                with transaction.atomic():
+                    payment.save()
+                    from orders.sales import record_paid_order
+                    record_paid_order(payment.order)
             except Payment.DoesNotExist:
                 pass
 
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Category, Juice, Branch, BranchProduct
+from .signals import catalog_changed
 
 
 @admin.register(Category)
@@ -12,11 +13,13 @@ class CategoryAdmin(admin.ModelAdmin):
 
     def activate_categories(self, request, queryset):
         updated = queryset.update(is_active=True)
+        catalog_changed()
         self.message_user(request, f'{updated} category(ies) activated.')
     activate_categories.short_description = 'Activate selected categories'
 
     def deactivate_categories(self, request, queryset):
         updated = queryset.update(is_active=False)
+        catalog_changed()
         self.message_user(request, f'{updated} category(ies) deactivated.')
     deactivate_categories.short_description = 'Deactivate selected categories'
 
@@ -44,21 +47,25 @@ class JuiceAdmin(admin.ModelAdmin):
 
     def mark_as_available(self, request, queryset):
         updated = queryset.update(is_available=True)
+        catalog_changed(product_ids=queryset.values_list('id', flat=True))
         self.message_user(request, f'{updated} juice(s) marked as available.')
     mark_as_available.short_description = 'Mark selected as Available'
 
     def mark_as_unavailable(self, request, queryset):
         updated = queryset.update(is_available=False)
+        catalog_changed(product_ids=queryset.values_list('id', flat=True))
         self.message_user(request, f'{updated} juice(s) marked as unavailable.')
     mark_as_unavailable.short_description = 'Mark selected as Unavailable'
 
     def activate_juices(self, request, queryset):
         updated = queryset.update(is_active=True)
+        catalog_changed(product_ids=queryset.values_list('id', flat=True))
         self.message_user(request, f'{updated} juice(s) activated.')
     activate_juices.short_description = 'Activate selected juices'
 
     def deactivate_juices(self, request, queryset):
         updated = queryset.update(is_active=False)
+        catalog_changed(product_ids=queryset.values_list('id', flat=True))
         self.message_user(request, f'{updated} juice(s) deactivated.')
     deactivate_juices.short_description = 'Deactivate selected juices'
 
@@ -0,0 +1,82 @@
+"""
+Versioned cache for the public catalog endpoints.
+
+Every cached catalog response is keyed by a global catalog version. Saving a
+Juice, Category, Branch or BranchProduct bumps the version (see signals.py),
+which makes all previously cached responses unreachable at once instead of
+deleting them key by key.
+
+The version only reaches every process when the cache is shared. With a
+per-process cache it expires after CATALOG_LOCAL_VERSION_TIMEOUT seconds,
+so changes made elsewhere (other workers, management commands) show up
+within that time.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.http import urlencode
+
+CATALOG_VERSION_KEY = 'catalog:version'
+
+# Cache backends whose contents are private to one process
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+def catalog_version_timeout():
+    """None (keep until bumped) with a shared cache, else the local timeout"""
+    if settings.CACHES['default']['BACKEND'] in PROCESS_LOCAL_CACHES:
+        return settings.CATALOG_LOCAL_VERSION_TIMEOUT
+    return None
+
+
+def get_catalog_version():
+    """Return the current catalog version, initialising it if missing"""
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so a version lost to eviction, expiry or a
+        # restart never collides with keys written under an earlier version
+        cache.add(CATALOG_VERSION_KEY, int(time.time() * 1000), timeout=catalog_version_timeout())
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response"""
+    try:
+        return cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        # Key missing (first write or evicted) - start a fresh version
+        get_catalog_version()
+        return cache.incr(CATALOG_VERSION_KEY)
+
+
+def catalog_cache_key(request, name):
+    """Build a cache key from the catalog version, endpoint name and request URL"""
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    url = f"{request.build_absolute_uri(request.path)}?{params}"
+    digest = hashlib.md5(url.encode('utf-8')).hexdigest()
+    return f"catalog:{get_catalog_version()}:{name}:{digest}"
+
+
+def get_cached_catalog_data(request, name, build):
+    """
+    Return response data for a catalog endpoint, building it with `build()`
+    only when this catalog version has not served the same URL yet.
+    """
+    key = catalog_cache_key(request, name)
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, settings.CATALOG_CACHE_TIMEOUT)
+    return data
+
+
+def catalog_etag(request, *args, **kwargs):
+    """ETag for catalog reads; it changes whenever the catalog version does"""
+    return f"catalog-{get_catalog_version()}"
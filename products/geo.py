@@ -0,0 +1,105 @@
+"""
+In-memory spatial index of branch locations.
+
+Active branches with coordinates are held sorted by latitude in flat float
+arrays. A lookup first narrows the candidates to the latitude band that the
+largest delivery radius can reach (two bisections), then runs haversine over
+that band only, so the cost grows with the branches near the customer rather
+than with the whole network. The index is tagged with the catalog version
+and rebuilt when a branch changes.
+"""
+
+import math
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .cache import get_catalog_version
+from .models import Branch
+from .serializers import BranchSerializer
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points given in radians"""
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def is_open_at(opening_time, closing_time, moment):
+    """True if `moment` falls inside opening hours, including past-midnight hours"""
+    if opening_time <= closing_time:
+        return opening_time <= moment < closing_time
+    return moment >= opening_time or moment < closing_time
+
+
+class BranchLocator:
+    def __init__(self):
+        self.version = None
+        self.latitudes = array('d')     # radians, ascending
+        self.longitudes = array('d')    # radians
+        self.radii = array('d')         # delivery radius in km
+        self.hours = []                 # (opening_time, closing_time)
+        self.rows = []                  # serialized branches
+        self.max_radius_km = 0.0
+        self.lock = threading.RLock()
+
+    def rebuild(self, version):
+        branches = sorted(
+            Branch.objects.filter(
+                is_active=True,
+                latitude__isnull=False,
+                longitude__isnull=False
+            ),
+            key=lambda branch: branch.latitude
+        )
+        with self.lock:
+            self.latitudes = array('d', [math.radians(b.latitude) for b in branches])
+            self.longitudes = array('d', [math.radians(b.longitude) for b in branches])
+            self.radii = array('d', [float(b.delivery_radius_km) for b in branches])
+            self.hours = [(b.opening_time, b.closing_time) for b in branches]
+            self.rows = list(BranchSerializer(branches, many=True).data)
+            self.max_radius_km = max(self.radii, default=0.0)
+            self.version = version
+
+    def ensure_current(self):
+        version = get_catalog_version()
+        if self.version != version:
+            self.rebuild(version)
+
+    def nearest(self, latitude, longitude, moment, include_closed=False):
+        """
+        Branches whose delivery radius covers the point, nearest first, as
+        dicts of the serialized branch plus distance_km and is_open. Closed
+        branches are left out unless `include_closed` is set.
+        """
+        self.ensure_current()
+        lat, lng = math.radians(latitude), math.radians(longitude)
+
+        with self.lock:
+            # No branch further away in latitude than the largest radius can serve
+            band = self.max_radius_km / EARTH_RADIUS_KM
+            start = bisect_left(self.latitudes, lat - band)
+            end = bisect_right(self.latitudes, lat + band)
+
+            matches = []
+            for i in range(start, end):
+                distance = haversine_km(lat, lng, self.latitudes[i], self.longitudes[i])
+                if distance > self.radii[i]:
+                    continue
+                is_open = is_open_at(*self.hours[i], moment)
+                if is_open or include_closed:
+                    matches.append((distance, i, is_open))
+
+            matches.sort()
+            return [
+                {**self.rows[i], 'distance_km': round(distance, 2), 'is_open': is_open}
+                for distance, i, is_open in matches
+            ]
+
+
+branch_locator = BranchLocator()
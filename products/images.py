@@ -0,0 +1,69 @@
+"""
+Product image URLs.
+
+Images live on Cloudinary, which resizes and re-encodes on the fly from a
+transformation segment in the URL. Every image gets its original URL plus
+named size variants, each in the original format and as WebP/AVIF, so
+clients can pick the smallest file that fits the slot. URLs are pure
+functions of the stored image name and are memoized per worker.
+"""
+
+from functools import lru_cache
+
+CLOUDINARY_UPLOAD_URL = "https://res.cloudinary.com/dxizjczfh/image/upload/"
+
+# Variant name -> Cloudinary size transformation
+IMAGE_SIZES = {
+    'thumbnail': 'c_fill,w_160,h_160',
+    'card': 'c_fill,w_480,h_480',
+    'detail': 'c_limit,w_1200',
+}
+
+# Output format -> Cloudinary format transformation ('' keeps the upload's format)
+IMAGE_FORMATS = {
+    'default': '',
+    'webp': 'f_webp',
+    'avif': 'f_avif',
+}
+
+
+def _image_path(name):
+    # Storage names carry a 'media/' prefix that is not part of the public id
+    if name.startswith('media/'):
+        name = name.replace('media/', '', 1)
+    return name
+
+
+def _transformed_url(path, *transformations):
+    segment = ','.join(t for t in transformations if t)
+    if segment:
+        return f"{CLOUDINARY_UPLOAD_URL}{segment}/{path}"
+    return f"{CLOUDINARY_UPLOAD_URL}{path}"
+
+
+@lru_cache(maxsize=4096)
+def image_url(name):
+    """Full-size URL for a stored image name, or None without an image"""
+    if not name:
+        return None
+    return _transformed_url(_image_path(name))
+
+
+@lru_cache(maxsize=4096)
+def image_variants(name, sizes=None):
+    """
+    {'thumbnail': {'default': url, 'webp': url, 'avif': url}, 'card': ...,
+    'detail': ...} for a stored image name, or None without an image. Pass a
+    tuple of `sizes` to get only those variants. The returned dict is shared
+    between callers and must not be modified.
+    """
+    if not name:
+        return None
+    path = _image_path(name)
+    return {
+        size: {
+            fmt: _transformed_url(path, IMAGE_SIZES[size], 'q_auto', format_transformation)
+            for fmt, format_transformation in IMAGE_FORMATS.items()
+        }
+        for size in (sizes or IMAGE_SIZES)
+    }
@@ -0,0 +1,41 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.recommendations import build_recommendations
+from products.signals import catalog_changed
+
+class Command(BaseCommand):
+    help = 'Rebuild "frequently bought together" recommendations from order history'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top', type=int, default=8,
+            help='Neighbours to keep per juice (default 8)'
+        )
+        parser.add_argument(
+            '--min-support', type=int, default=2,
+            help='Orders a pair must share to count (default 2)'
+        )
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Only use orders from the last N days'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['days']:
+            since = timezone.now() - timedelta(days=options['days'])
+
+        written = build_recommendations(
+            top_n=options['top'],
+            min_support=options['min_support'],
+            since=since
+        )
+        # Cached product detail responses embed recommendations
+        catalog_changed()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Recommendations rebuilt: {written} juice pairs stored'
+        ))
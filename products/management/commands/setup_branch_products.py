@@ -1,36 +1,91 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from products.models import Branch, Juice, BranchProduct
+from products.signals import catalog_changed
 
 class Command(BaseCommand):
     help = 'Setup product availability for all branches (all products available initially)'
-    
-    def handle(self, *args, **kwargs):
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--branch', type=int, action='append', dest='branch_ids',
+            help='Only provision this branch id (repeatable)'
+        )
+        parser.add_argument(
+            '--category', type=int, action='append', dest='category_ids',
+            help='Only provision products of this category id (repeatable)'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Show the links that would be created without writing them'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Rows per INSERT (default 1000)'
+        )
+
+    def handle(self, *args, **options):
         branches = Branch.objects.filter(is_active=True)
         products = Juice.objects.filter(is_active=True)
-        
-        if not branches.exists():
+        if options['branch_ids']:
+            branches = branches.filter(id__in=options['branch_ids'])
+        if options['category_ids']:
+            products = products.filter(category_id__in=options['category_ids'])
+
+        branch_ids = list(branches.values_list('id', flat=True))
+        product_ids = list(products.values_list('id', flat=True))
+
+        if not branch_ids:
             self.stdout.write(self.style.ERROR('No branches found! Run seed_branches first.'))
             return
-        
-        if not products.exists():
+
+        if not product_ids:
             self.stdout.write(self.style.ERROR('No products found! Make sure products are seeded.'))
             return
-        
-        created_count = 0
-        
-        for branch in branches:
-            for product in products:
-                _, created = BranchProduct.objects.get_or_create(
-                    branch=branch,
-                    product=product,
-                    defaults={'is_available': True}
-                )
-                if created:
-                    created_count += 1
-        
+
+        # Every link that already exists in scope, fetched in one query
+        existing = set(
+            BranchProduct.objects.filter(
+                branch_id__in=branch_ids,
+                product_id__in=product_ids
+            ).values_list('branch_id', 'product_id')
+        )
+        missing = [
+            (branch_id, product_id)
+            for branch_id in branch_ids
+            for product_id in product_ids
+            if (branch_id, product_id) not in existing
+        ]
+
+        if options['dry_run']:
+            per_branch = {}
+            for branch_id, _ in missing:
+                per_branch[branch_id] = per_branch.get(branch_id, 0) + 1
+            names = dict(Branch.objects.filter(id__in=per_branch).values_list('id', 'name'))
+            for branch_id, count in sorted(per_branch.items()):
+                self.stdout.write(f'  {names[branch_id]} (#{branch_id}): +{count} links')
+            self.stdout.write(self.style.WARNING(
+                f'Dry run: would create {len(missing)} branch-product links'
+            ))
+            return
+
+        # ignore_conflicts keeps concurrent or repeated runs idempotent
+        with transaction.atomic():
+            BranchProduct.objects.bulk_create(
+                [
+                    BranchProduct(branch_id=branch_id, product_id=product_id, is_available=True)
+                    for branch_id, product_id in missing
+                ],
+                batch_size=options['batch_size'],
+                ignore_conflicts=True
+            )
+            # bulk_create sends no save signals; invalidate menus once
+            if missing:
+                catalog_changed(branch_ids={branch_id for branch_id, _ in missing})
+
         self.stdout.write(self.style.SUCCESS(
-            f'Setup complete! Created {created_count} branch-product links'
+            f'Setup complete! Created {len(missing)} branch-product links'
         ))
         self.stdout.write(self.style.SUCCESS(
-            f'Total: {branches.count()} branches × {products.count()} products = {branches.count() * products.count()} links'
+            f'Total: {len(branch_ids)} branches × {len(product_ids)} products = {len(branch_ids) * len(product_ids)} links'
         ))
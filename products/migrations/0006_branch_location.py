@@ -0,0 +1,28 @@
+# Generated by Django 5.2.9 on 2026-10-18 20:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_branch_alter_category_options_branchproduct'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='branch',
+            name='delivery_radius_km',
+            field=models.DecimalField(decimal_places=2, default=5, help_text='How far from the branch orders are delivered', max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='branch',
+            name='latitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='branch',
+            name='longitude',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=9, null=True),
+        ),
+    ]
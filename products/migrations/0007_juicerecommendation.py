@@ -0,0 +1,31 @@
+# Generated by Django 5.2.9 on 2026-10-18 20:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_branch_location'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JuiceRecommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('support', models.PositiveIntegerField(help_text='Orders containing both juices')),
+                ('confidence', models.FloatField(help_text='Share of orders with this juice that also had the recommended one')),
+                ('lift', models.FloatField(help_text='How much more often the pair occurs than by chance')),
+                ('juice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='products.juice')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='products.juice')),
+            ],
+            options={
+                'ordering': ['juice', 'rank'],
+                'indexes': [models.Index(fields=['juice', 'rank'], name='juice_recommendation_rank_idx')],
+                'unique_together': {('juice', 'recommended')},
+            },
+        ),
+    ]
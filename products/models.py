@@ -24,6 +24,14 @@ class Branch(models.Model):
     is_active = models.BooleanField(default=True)
     opening_time = models.TimeField()
     closing_time = models.TimeField()
+    latitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    longitude = models.DecimalField(max_digits=9, decimal_places=6, null=True, blank=True)
+    delivery_radius_km = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=5,
+        help_text="How far from the branch orders are delivered"
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     
     def __str__(self):
@@ -151,3 +159,23 @@ class Juice(models.Model):
     def __str__(self):
         return f"{self.name} - ₹{self.price}"
 
+
+
+class JuiceRecommendation(models.Model):
+    """Precomputed "frequently bought together" neighbours of a juice"""
+    juice = models.ForeignKey(Juice, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Juice, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    support = models.PositiveIntegerField(help_text="Orders containing both juices")
+    confidence = models.FloatField(help_text="Share of orders with this juice that also had the recommended one")
+    lift = models.FloatField(help_text="How much more often the pair occurs than by chance")
+
+    class Meta:
+        unique_together = ['juice', 'recommended']
+        ordering = ['juice', 'rank']
+        indexes = [
+            models.Index(fields=['juice', 'rank'], name='juice_recommendation_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.juice.name} -> {self.recommended.name} (#{self.rank})"
@@ -0,0 +1,122 @@
+"""
+Columnar in-memory copy of the active catalog for nutrition filtering.
+
+The nutrition and price columns of every active juice are held as flat
+float arrays (NaN where a value is missing) next to the serialized product
+rows. Filters become a pass over a column and sorting an index sort on one,
+so any combination of ?min_*/max_*/sort is answered without a database
+round trip. The copy is rebuilt whenever the catalog version changes.
+"""
+
+import math
+from array import array
+
+from rest_framework.exceptions import ParseError
+
+from .cache import get_catalog_version
+from .models import Juice
+from .serializers import JuiceSerializer
+
+# Public filter/sort names -> Juice columns
+NUTRITION_COLUMNS = {
+    'calories': 'nutrition_calories',
+    'fat': 'nutrition_total_fat',
+    'carbohydrate': 'nutrition_carbohydrate',
+    'fiber': 'nutrition_dietary_fiber',
+    'sugar': 'nutrition_total_sugars',
+    'protein': 'nutrition_protein',
+    'price': 'price',
+}
+
+
+def _as_float(value):
+    return math.nan if value is None else float(value)
+
+
+class NutritionCatalog:
+    def __init__(self, version, juices):
+        self.version = version
+        self.rows = list(JuiceSerializer(juices, many=True).data)
+        self.ids = array('q', [juice.id for juice in juices])
+        self.category_ids = array('q', [juice.category_id for juice in juices])
+        self.columns = {
+            name: array('d', [_as_float(getattr(juice, column)) for juice in juices])
+            for name, column in NUTRITION_COLUMNS.items()
+        }
+
+    def query(self, bounds=(), category_id=None, sort=None, ranking=None):
+        """
+        Return matching rows. `bounds` is a list of (name, low, high) with
+        None for an open end; `sort` is a column name, '-' prefixed for
+        descending. Juices missing a filtered value never match, and juices
+        missing the sort value go last. Alternatively `ranking` is a list of
+        juice ids to order by, with unranked juices last in id order.
+        """
+        indexes = range(len(self.rows))
+        if category_id is not None:
+            categories = self.category_ids
+            indexes = [i for i in indexes if categories[i] == category_id]
+        for name, low, high in bounds:
+            column = self.columns[name]
+            if low is not None:
+                indexes = [i for i in indexes if column[i] >= low]
+            if high is not None:
+                indexes = [i for i in indexes if column[i] <= high]
+        indexes = list(indexes)
+
+        if sort:
+            descending = sort.startswith('-')
+            column = self.columns[sort.lstrip('-')]
+            present = [i for i in indexes if not math.isnan(column[i])]
+            missing = [i for i in indexes if math.isnan(column[i])]
+            present.sort(key=column.__getitem__, reverse=descending)
+            indexes = present + missing
+        elif ranking is not None:
+            positions = {juice_id: position for position, juice_id in enumerate(ranking)}
+            ids = self.ids
+            indexes.sort(key=lambda i: positions.get(ids[i], len(positions)))
+
+        return [self.rows[i] for i in indexes]
+
+
+_catalog = None
+
+
+def get_nutrition_catalog():
+    """Return the columnar catalog for the current catalog version"""
+    global _catalog
+    version = get_catalog_version()
+    if _catalog is None or _catalog.version != version:
+        juices = list(Juice.objects.filter(is_active=True).select_related('category').order_by('id'))
+        _catalog = NutritionCatalog(version, juices)
+    return _catalog
+
+
+def parse_nutrition_query(query_params, extra_sorts=()):
+    """
+    Read ?min_<name>=, ?max_<name>= and ?sort=[-]<name> from the request.
+    `extra_sorts` are further ?sort= values the caller handles itself.
+    Returns (bounds, sort), or None when the request uses none of them.
+    """
+    bounds = []
+    for name in NUTRITION_COLUMNS:
+        limits = []
+        for prefix in ('min', 'max'):
+            raw = query_params.get(f'{prefix}_{name}')
+            if raw in (None, ''):
+                limits.append(None)
+                continue
+            try:
+                limits.append(float(raw))
+            except ValueError:
+                raise ParseError(f"{prefix}_{name} must be a number")
+        if limits != [None, None]:
+            bounds.append((name, limits[0], limits[1]))
+
+    sort = query_params.get('sort') or None
+    if sort and sort not in extra_sorts and sort.lstrip('-') not in NUTRITION_COLUMNS:
+        choices = [*NUTRITION_COLUMNS, *extra_sorts]
+        raise ParseError(f"Unknown sort '{sort}'. Choose one of: {', '.join(choices)}")
+    if not bounds and not sort:
+        return None
+    return bounds, sort
@@ -0,0 +1,27 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CountableCursorPagination(CursorPagination):
+    """
+    Keyset pagination with opaque cursors. Pages cost the same however deep
+    the client scrolls because no OFFSET or COUNT(*) is issued; pass
+    ?include_total=true to opt into a total count.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        include_total = request.query_params.get('include_total', '').lower() in ('1', 'true')
+        self.total = queryset.count() if include_total else None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.total is not None:
+            response.data['count'] = self.total
+        return response
+
+
+class JuiceCursorPagination(CountableCursorPagination):
+    ordering = 'id'
@@ -0,0 +1,120 @@
+"""
+"Frequently bought together" recommendations.
+
+build_recommendations() counts, over past orders, how often each juice was
+bought and how often each pair of juices shared an order, scores every pair
+by lift and confidence, and stores the top neighbours of each juice in
+JuiceRecommendation. Requests only read that table.
+"""
+
+from collections import Counter
+from itertools import combinations
+
+from django.db import transaction
+
+from .models import Juice, JuiceRecommendation
+from .serializers import JuiceListSerializer, JUICE_CARD_FIELDS, juice_columns
+
+
+def _order_baskets(since=None):
+    """Yield the set of juice ids of every non-cancelled order"""
+    from orders.models import OrderItem
+
+    items = OrderItem.objects.exclude(order__status='cancelled')
+    if since is not None:
+        items = items.filter(order__created_at__gte=since)
+
+    order_id, basket = None, set()
+    for item_order_id, juice_id in items.order_by('order_id').values_list('order_id', 'juice_id').iterator():
+        if item_order_id != order_id:
+            if basket:
+                yield basket
+            order_id, basket = item_order_id, set()
+        basket.add(juice_id)
+    if basket:
+        yield basket
+
+
+def score_pairs(baskets, min_support=2):
+    """
+    Return {juice id: [(other id, support, confidence, lift), ...]} for every
+    ordered pair seen together in at least `min_support` baskets, where
+    confidence = P(other | juice) and lift = confidence / P(other).
+    """
+    order_count = 0
+    juice_counts = Counter()
+    pair_counts = Counter()
+    for basket in baskets:
+        order_count += 1
+        juice_counts.update(basket)
+        pair_counts.update(combinations(sorted(basket), 2))
+
+    neighbours = {}
+    for (a, b), support in pair_counts.items():
+        if support < min_support:
+            continue
+        lift = support * order_count / (juice_counts[a] * juice_counts[b])
+        neighbours.setdefault(a, []).append((b, support, support / juice_counts[a], lift))
+        neighbours.setdefault(b, []).append((a, support, support / juice_counts[b], lift))
+    return neighbours
+
+
+def build_recommendations(top_n=8, min_support=2, since=None):
+    """Recompute and replace the recommendation table; returns rows written"""
+    neighbours = score_pairs(_order_baskets(since), min_support=min_support)
+    active_ids = set(Juice.objects.filter(is_active=True).values_list('id', flat=True))
+
+    rows = []
+    for juice_id, candidates in neighbours.items():
+        if juice_id not in active_ids:
+            continue
+        candidates = [c for c in candidates if c[0] in active_ids]
+        # Strongest association first; confidence and support break ties
+        candidates.sort(key=lambda c: (c[3], c[2], c[1]), reverse=True)
+        for rank, (other_id, support, confidence, lift) in enumerate(candidates[:top_n], start=1):
+            rows.append(JuiceRecommendation(
+                juice_id=juice_id,
+                recommended_id=other_id,
+                rank=rank,
+                support=support,
+                confidence=confidence,
+                lift=lift
+            ))
+
+    with transaction.atomic():
+        JuiceRecommendation.objects.all().delete()
+        JuiceRecommendation.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def recommended_juices(juice_ids, exclude=(), limit=6):
+    """
+    Card payloads of the juices most often bought with `juice_ids`, best
+    first. Neighbour lists of several juices are merged by summed lift.
+    The neighbour rows and the recommended juices' cards come back in one
+    query.
+    """
+    juice_ids = list(juice_ids)
+    if not juice_ids:
+        return []
+    exclude = set(exclude) | set(juice_ids)
+
+    neighbours = JuiceRecommendation.objects.filter(
+        juice_id__in=juice_ids,
+        recommended__is_active=True
+    ).select_related('recommended__category').only(
+        'recommended_id',
+        'lift',
+        *(f'recommended__{column}' for column in juice_columns(JUICE_CARD_FIELDS))
+    )
+
+    scores, juices = {}, {}
+    for row in neighbours:
+        if row.recommended_id not in exclude:
+            scores[row.recommended_id] = scores.get(row.recommended_id, 0) + row.lift
+            juices[row.recommended_id] = row.recommended
+    if not scores:
+        return []
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return JuiceListSerializer([juices[i] for i in ranked], many=True).data
@@ -0,0 +1,244 @@
+"""
+In-process product search index.
+
+An inverted index over Juice name, ingredients, features and description,
+with prefix completion for the word being typed and edit-distance-1 matching
+for typos. The index lives in each worker process, is tagged with the
+catalog version it reflects, and is updated incrementally when products are
+saved in this process or rebuilt when another process changed the catalog.
+"""
+
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+
+from .cache import get_catalog_version
+from .models import Juice
+from .serializers import JuiceListSerializer
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# How much a hit in each field counts towards a product's score
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'ingredients': 2.0,
+    'features': 2.0,
+    'description': 1.0,
+}
+
+# How much each kind of term match counts relative to an exact match
+EXACT, PREFIX, FUZZY = 1.0, 0.7, 0.5
+
+# Prefix expansion only kicks in once a few characters have been typed
+MIN_PREFIX_LENGTH = 2
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def _deletes(term):
+    """All variants of a term with one character removed"""
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+
+def _within_one_edit(a, b):
+    """True if a and b differ by at most one insert, delete, substitution or swap"""
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diffs = [i for i in range(la) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return (
+            len(diffs) == 2 and diffs[1] == diffs[0] + 1
+            and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]]
+        )
+    if la > lb:
+        a, b = b, a
+    # b is one character longer than a
+    for i in range(len(b)):
+        if b[:i] + b[i + 1:] == a:
+            return True
+    return False
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self.version = None
+        self.docs = {}                          # juice id -> card payload
+        self.doc_terms = {}                     # juice id -> {term: weight}
+        self.postings = defaultdict(dict)       # term -> {juice id: weight}
+        self.delete_index = defaultdict(set)    # one-deletion variant -> terms
+        self.terms = []                         # sorted vocabulary for prefix lookups
+        self.lock = threading.RLock()
+
+    # ---------- building ----------
+
+    def _doc_terms(self, juice):
+        terms = {}
+        fields = {
+            'name': juice.name,
+            'ingredients': juice.ingredients,
+            'features': ' '.join(str(feature) for feature in (juice.features or [])),
+            'description': juice.description,
+        }
+        for field, text in fields.items():
+            for term in tokenize(text):
+                terms[term] = max(terms.get(term, 0), FIELD_WEIGHTS[field])
+        return terms
+
+    def _add(self, juice, payload):
+        terms = self._doc_terms(juice)
+        self.docs[juice.id] = payload
+        self.doc_terms[juice.id] = terms
+        for term, weight in terms.items():
+            if not self.postings[term]:
+                for variant in _deletes(term):
+                    self.delete_index[variant].add(term)
+            self.postings[term][juice.id] = weight
+
+    def _remove(self, juice_id):
+        self.docs.pop(juice_id, None)
+        for term in self.doc_terms.pop(juice_id, {}):
+            postings = self.postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(juice_id, None)
+            if not postings:
+                del self.postings[term]
+                for variant in _deletes(term):
+                    self.delete_index[variant].discard(term)
+
+    @staticmethod
+    def _load(queryset):
+        juices = list(queryset.select_related('category'))
+        payloads = JuiceListSerializer(juices, many=True).data
+        return zip(juices, payloads)
+
+    def rebuild(self, version):
+        with self.lock:
+            self.docs.clear()
+            self.doc_terms.clear()
+            self.postings.clear()
+            self.delete_index.clear()
+            for juice, payload in self._load(Juice.objects.filter(is_active=True)):
+                self._add(juice, payload)
+            self.terms = sorted(self.postings)
+            self.version = version
+
+    def update_products(self, product_ids, version):
+        """Re-index the given products in place"""
+        with self.lock:
+            for juice_id in product_ids:
+                self._remove(juice_id)
+            queryset = Juice.objects.filter(id__in=product_ids, is_active=True)
+            for juice, payload in self._load(queryset):
+                self._add(juice, payload)
+            self.terms = sorted(self.postings)
+            self.version = version
+
+    def catalog_changed(self, product_ids, version):
+        """
+        Follow a catalog version bump. `product_ids` of None means any product
+        card may have changed (a category was renamed or deleted) and the
+        index is rebuilt; an empty set means no indexed product changed. Only
+        an index that was current right before the bump can be patched;
+        anything older is rebuilt lazily.
+        """
+        with self.lock:
+            if self.version is None or self.version != version - 1:
+                return
+            if product_ids is None:
+                self.rebuild(version)
+            elif product_ids:
+                self.update_products(product_ids, version)
+            else:
+                self.version = version
+
+    def ensure_current(self):
+        version = get_catalog_version()
+        if self.version != version:
+            self.rebuild(version)
+
+    # ---------- querying ----------
+
+    def _completions(self, prefix, limit=None):
+        start = bisect_left(self.terms, prefix)
+        matches = []
+        for term in self.terms[start:]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+            if limit and len(matches) >= limit:
+                break
+        return matches
+
+    def _fuzzy(self, term):
+        candidates = set(self.delete_index.get(term, ()))
+        for variant in _deletes(term):
+            if variant in self.postings:
+                candidates.add(variant)
+            candidates.update(self.delete_index.get(variant, ()))
+        return [
+            candidate for candidate in candidates
+            if candidate != term and _within_one_edit(term, candidate)
+        ]
+
+    def _matching_terms(self, token, is_last):
+        """Yield (term, match strength) pairs for one query token"""
+        if token in self.postings:
+            yield token, EXACT
+        if is_last and len(token) >= MIN_PREFIX_LENGTH:
+            for term in self._completions(token):
+                if term != token:
+                    yield term, PREFIX
+        if len(token) > 2:
+            for term in self._fuzzy(token):
+                yield term, FUZZY
+
+    def search(self, query, limit=10):
+        """Return (card payloads, term suggestions) for a query"""
+        tokens = tokenize(query)
+        if not tokens:
+            return [], []
+
+        with self.lock:
+            scores = None
+            for position, token in enumerate(tokens):
+                token_scores = {}
+                for term, strength in self._matching_terms(token, position == len(tokens) - 1):
+                    for juice_id, weight in self.postings[term].items():
+                        score = strength * weight
+                        if score > token_scores.get(juice_id, 0):
+                            token_scores[juice_id] = score
+                # Every query word has to match something in the product
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        juice_id: score + token_scores[juice_id]
+                        for juice_id, score in scores.items()
+                        if juice_id in token_scores
+                    }
+                if not scores:
+                    break
+
+            ranked = sorted(
+                scores or {},
+                key=lambda juice_id: (-scores[juice_id], self.docs[juice_id]['name'])
+            )
+            results = [self.docs[juice_id] for juice_id in ranked[:limit]]
+
+            last = tokens[-1]
+            suggestions = []
+            if len(last) >= MIN_PREFIX_LENGTH:
+                suggestions = self._completions(last, limit=5)
+        return results, suggestions
+
+
+search_index = ProductSearchIndex()
@@ -1,11 +1,14 @@
 from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from .images import image_url, image_variants
 from .models import Category, Juice, Branch
 
 class BranchSerializer(serializers.ModelSerializer):
     class Meta:
         model = Branch
         fields = ['id', 'name', 'address', 'city', 'state', 'pincode', 
-                  'phone', 'email', 'opening_time', 'closing_time', 'is_active']
+                  'phone', 'email', 'opening_time', 'closing_time', 'is_active',
+                  'latitude', 'longitude', 'delivery_radius_km']
 
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
@@ -18,19 +21,25 @@ class CategoryMiniSerializer(serializers.ModelSerializer):
         fields = ['id', 'name']
 
 class JuiceSerializer(serializers.ModelSerializer):
+    """
+    Full product representation. Pass `fields` to emit only a subset of it
+    (see JUICE_VIEWS / parse_juice_fields).
+    """
     category = CategoryMiniSerializer(read_only=True)
     image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
     
     def get_image(self, obj):
-        if obj.image:
-            # Get the image name/path
-            image_path = str(obj.image)
-            # Remove 'media/' prefix if present  
-            if image_path.startswith('media/'):
-                image_path = image_path.replace('media/', '', 1)
-            # Return proper Cloudinary URL
-            return f"https://res.cloudinary.com/dxizjczfh/image/upload/{image_path}"
-        return None
+        return image_url(obj.image.name)
+
+    def get_image_variants(self, obj):
+        return image_variants(obj.image.name)
 
     class Meta:
         model = Juice
@@ -41,6 +50,7 @@ class JuiceSerializer(serializers.ModelSerializer):
             'description',
             'long_description',
             'image',
+            'image_variants',
             'is_available',
             'category',
             'net_quantity_ml',
@@ -54,4 +64,75 @@ class JuiceSerializer(serializers.ModelSerializer):
             'nutrition_protein',
             'ingredients',
             'allergen_info'
-        ]
\ No newline at end of file
+        ]
+
+
+# Fields the menu grid renders (name, price, image, category). The
+# image_variants URL sets outweigh the rest of a card, so grids ask for them
+# with ?fields= when they want them.
+JUICE_CARD_FIELDS = [
+    'id',
+    'name',
+    'price',
+    'description',
+    'image',
+    'is_available',
+    'category',
+    'net_quantity_ml'
+]
+
+# Named representations selectable with ?view=
+JUICE_VIEWS = {
+    'card': JUICE_CARD_FIELDS,
+    'full': JuiceSerializer.Meta.fields,
+}
+
+# Model columns each serializer field reads
+_JUICE_FIELD_COLUMNS = {
+    'category': ('category', 'category__name'),
+    'image_variants': ('image',),
+}
+
+
+class JuiceListSerializer(JuiceSerializer):
+    """Menu grid representation without the detail page text and JSON fields"""
+
+    class Meta(JuiceSerializer.Meta):
+        fields = JUICE_CARD_FIELDS
+
+
+def parse_juice_fields(query_params, default_view='full'):
+    """
+    Resolve ?fields=a,b,c or ?view=card|full into a list of JuiceSerializer
+    fields. `id` is always included.
+    """
+    fields_param = query_params.get('fields')
+    if fields_param:
+        fields = [name.strip() for name in fields_param.split(',') if name.strip()]
+        unknown = [name for name in fields if name not in JuiceSerializer.Meta.fields]
+        if unknown:
+            raise ParseError(f"Unknown fields: {', '.join(unknown)}")
+    else:
+        view = query_params.get('view', default_view)
+        if view not in JUICE_VIEWS:
+            raise ParseError(f"Unknown view '{view}'. Choose one of: {', '.join(JUICE_VIEWS)}")
+        fields = JUICE_VIEWS[view]
+
+    if 'id' not in fields:
+        fields = ['id'] + fields
+    return fields
+
+
+def juice_columns(fields):
+    """Juice columns that rendering `fields` reads"""
+    columns = []
+    for name in fields:
+        columns.extend(_JUICE_FIELD_COLUMNS.get(name, (name,)))
+    return columns
+
+
+def project_juices(queryset, fields):
+    """Restrict a Juice queryset to the columns (and joins) that `fields` render"""
+    if 'category' in fields:
+        queryset = queryset.select_related('category')
+    return queryset.only(*juice_columns(fields))
@@ -0,0 +1,62 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .availability import availability_index
+from .cache import bump_catalog_version
+from .models import Category, Juice, Branch, BranchProduct
+from .search import search_index
+
+
+def catalog_changed(branch_ids=(), product_ids=()):
+    """
+    Invalidate cached catalog data once the current transaction commits,
+    re-index changed products for search and refresh the availability index
+    of the branches that were touched, either directly or through one of
+    their products. Menu snapshots are keyed by the catalog version and
+    rebuilt on their next read.
+    """
+    branch_ids = set(branch_ids)
+    product_ids = set(product_ids)
+
+    def invalidate():
+        version = bump_catalog_version()
+        # A change naming no branch or product (a category) can touch any card
+        search_index.catalog_changed(
+            product_ids if branch_ids or product_ids else None, version
+        )
+        touched = set(branch_ids)
+        if product_ids:
+            touched.update(
+                BranchProduct.objects.filter(product_id__in=product_ids)
+                .values_list('branch_id', flat=True)
+            )
+        availability_index.catalog_changed(touched, version)
+
+    transaction.on_commit(invalidate)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_catalog_cache(sender, **kwargs):
+    """Any menu change makes every cached catalog response stale"""
+    catalog_changed()
+
+
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def invalidate_branch_cache(sender, instance, **kwargs):
+    # (De)activating a branch changes what it can sell
+    catalog_changed(branch_ids=[instance.pk])
+
+
+@receiver(post_save, sender=Juice)
+@receiver(post_delete, sender=Juice)
+def invalidate_product_cache(sender, instance, **kwargs):
+    catalog_changed(product_ids=[instance.pk])
+
+
+@receiver(post_save, sender=BranchProduct)
+@receiver(post_delete, sender=BranchProduct)
+def invalidate_branch_product_cache(sender, instance, **kwargs):
+    catalog_changed(branch_ids=[instance.branch_id])
@@ -0,0 +1,156 @@
+"""
+Pre-rendered per-branch menu snapshots.
+
+A branch menu is the same for every customer until availability or a product
+changes, so every page of it (for each category filter) is rendered once to
+JSON, compressed, and stored in the cache under the branch and catalog
+version. BranchProductsAPIView then answers plain menu requests with the
+stored bytes without touching the ORM or the serializers.
+
+Snapshots are built lazily: a catalog change only moves the version, and
+the first read of a branch menu under the new version renders it while
+concurrent readers take the live path.
+"""
+
+import gzip
+import hashlib
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .cache import get_catalog_version
+from .models import Branch, Juice
+from .serializers import JuiceListSerializer, JUICE_CARD_FIELDS, project_juices
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Query params a snapshot can answer; anything else takes the live path
+SNAPSHOT_QUERY_PARAMS = {'page', 'category_id'}
+
+
+def _snapshot_key(version, branch_id, base_url, suffix):
+    url_digest = hashlib.md5(base_url.encode('utf-8')).hexdigest()
+    return f"menu-snapshot:{version}:{branch_id}:{url_digest}:{suffix}"
+
+
+# How long one reader may spend building a branch snapshot
+BUILD_LOCK_TIMEOUT = 30
+
+
+def _encode(body):
+    """Return the identity, gzip and (when available) brotli bodies"""
+    return {
+        'identity': body,
+        'gzip': gzip.compress(body, compresslevel=9),
+        'br': brotli.compress(body) if brotli else None,
+    }
+
+
+def _page_link(url, number):
+    if number == 1:
+        return remove_query_param(url, 'page')
+    return replace_query_param(url, 'page', number)
+
+
+def build_branch_menu_snapshot(branch_id, base_url):
+    """
+    Render and store every menu page of a branch for the given endpoint URL.
+    Returns False when the branch does not exist or is inactive.
+    """
+    from .views import JuicePagination
+
+    version = get_catalog_version()
+    if not Branch.objects.filter(id=branch_id, is_active=True).exists():
+        return False
+
+    juices = project_juices(Juice.objects.filter(
+        is_active=True,
+        branch_availability__branch_id=branch_id,
+        branch_availability__is_available=True
+    ), JUICE_CARD_FIELDS).order_by('id')
+    rows = JuiceListSerializer(juices, many=True).data
+
+    # Group rows per category filter ('' is the unfiltered menu)
+    groups = {'': list(rows)}
+    for row in rows:
+        groups.setdefault(str(row['category']['id']), []).append(row)
+
+    page_size = JuicePagination.page_size
+    renderer = JSONRenderer()
+    entries = {}
+    for category_id, group_rows in groups.items():
+        url = base_url
+        if category_id:
+            url = replace_query_param(base_url, 'category_id', category_id)
+        page_count = max(1, math.ceil(len(group_rows) / page_size))
+        for number in range(1, page_count + 1):
+            data = {
+                'count': len(group_rows),
+                'next': _page_link(url, number + 1) if number < page_count else None,
+                'previous': _page_link(url, number - 1) if number > 1 else None,
+                'results': group_rows[(number - 1) * page_size:number * page_size],
+            }
+            key = _snapshot_key(version, branch_id, base_url, f"{category_id}:{number}")
+            entries[key] = _encode(renderer.render(data))
+
+    entries[_snapshot_key(version, branch_id, base_url, 'built')] = True
+    cache.set_many(entries, settings.CATALOG_CACHE_TIMEOUT)
+    return True
+
+
+def get_branch_menu_page(request, branch_id):
+    """
+    Return the stored encodings of the requested menu page, building the
+    branch snapshot on first use. Returns None when the request cannot be
+    answered from a snapshot.
+    """
+    params = request.query_params
+    if set(params) - SNAPSHOT_QUERY_PARAMS or request.accepted_renderer.format != 'json':
+        return None
+
+    page = params.get('page', '1')
+    category_id = params.get('category_id', '')
+    if not page.isdigit() or (category_id and not category_id.isdigit()):
+        return None
+
+    version = get_catalog_version()
+    base_url = request.build_absolute_uri(request.path)
+    key = _snapshot_key(version, branch_id, base_url, f"{category_id}:{int(page)}")
+
+    entry = cache.get(key)
+    built_key = _snapshot_key(version, branch_id, base_url, 'built')
+    if entry is None and not cache.get(built_key):
+        # One reader builds the snapshot; the others are served live meanwhile
+        lock_key = _snapshot_key(version, branch_id, base_url, 'building')
+        if not cache.add(lock_key, True, BUILD_LOCK_TIMEOUT):
+            return None
+        try:
+            if build_branch_menu_snapshot(branch_id, base_url):
+                entry = cache.get(key)
+        finally:
+            cache.delete(lock_key)
+    return entry
+
+
+def menu_page_response(request, entry):
+    """Serve a stored page, picking the best encoding the client accepts"""
+    accepted = {
+        part.split(';')[0].strip().lower()
+        for part in request.META.get('HTTP_ACCEPT_ENCODING', '').split(',')
+    }
+    for encoding in ('br', 'gzip'):
+        if encoding in accepted and entry[encoding] is not None:
+            response = HttpResponse(entry[encoding], content_type='application/json')
+            response['Content-Encoding'] = encoding
+            break
+    else:
+        response = HttpResponse(entry['identity'], content_type='application/json')
+    response['Vary'] = 'Accept-Encoding'
+    return response
@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import CategoryListAPIView, JuiceListAPIView, JuiceDetailAPIView, BranchListAPIView, BranchProductsAPIView
+from .views import CategoryListAPIView, JuiceListAPIView, JuiceDetailAPIView, JuiceSearchAPIView, BranchListAPIView, NearestBranchAPIView, BranchProductsAPIView
 from .views_admin import (
     ToggleJuiceAvailabilityAPIView,
     ToggleJuiceActiveAPIView,
@@ -10,9 +10,11 @@ urlpatterns = [
     path('categories/', CategoryListAPIView.as_view(), name='category-list'),
     path('juices/', JuiceListAPIView.as_view(), name='juice-list'),
     path('juices/<int:pk>/', JuiceDetailAPIView.as_view(), name='juice-detail'),
+    path('search/', JuiceSearchAPIView.as_view(), name='juice-search'),
     
     # Branch APIs
     path('branches/', BranchListAPIView.as_view(), name='branch-list'),
+    path('branches/nearest/', NearestBranchAPIView.as_view(), name='branch-nearest'),
     path('branches/<int:branch_id>/products/', BranchProductsAPIView.as_view(), name='branch-products'),
     
     # Admin APIs
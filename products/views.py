@@ -2,62 +2,226 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
-from .models import Juice, Category, Branch, BranchProduct
-from .serializers import JuiceSerializer, CategorySerializer, BranchSerializer
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from .models import Juice, Category, Branch
+from .serializers import (
+    JuiceSerializer,
+    CategorySerializer,
+    BranchSerializer,
+    parse_juice_fields,
+    project_juices,
+)
+from .cache import get_cached_catalog_data, catalog_etag
+from .snapshots import get_branch_menu_page, menu_page_response
+from .search import search_index
+from .nutrition import get_nutrition_catalog, parse_nutrition_query
+from .pagination import JuiceCursorPagination
+from .geo import branch_locator
+from .recommendations import recommended_juices
+from django.db.models import Case, Value, When
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from orders.sales import POPULARITY_WINDOWS, get_popularity_version, popular_juice_ids
 
 class CategoryListAPIView(APIView):
 
     def get(self, request):
-        categories = Category.objects.filter(is_active=True)
-        serializer = CategorySerializer(categories, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        def build():
+            categories = Category.objects.filter(is_active=True)
+            return CategorySerializer(categories, many=True).data
+
+        data = get_cached_catalog_data(request, 'categories', build)
+        return Response(data, status=status.HTTP_200_OK)
+
+def menu_etag(request, *args, **kwargs):
+    """
+    Catalog ETag, which popularity-sorted menus extend with the sales
+    version. It is weak because snapshot pages are served as br, gzip or
+    identity bodies that are equivalent but not byte-identical.
+    """
+    etag = catalog_etag(request)
+    if request.GET.get('sort') in POPULARITY_WINDOWS:
+        etag = f"{etag}-popularity-{get_popularity_version()}"
+    return f'W/"{etag}"'
 
 class JuicePagination(PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+@method_decorator(condition(etag_func=menu_etag), name='get')
 class JuiceListAPIView(APIView):
     pagination_class = JuicePagination
 
     def get(self, request):
+        fields = parse_juice_fields(request.query_params)
+
+        # Nutrition filters and sorts (and ?sort=popular) are answered from
+        # the in-memory catalog
+        nutrition_query = parse_nutrition_query(request.query_params, extra_sorts=POPULARITY_WINDOWS)
+        if nutrition_query is not None:
+            return self.get_from_nutrition_catalog(request, fields, *nutrition_query)
+
+        def build():
+            category_id = request.query_params.get('category_id')
+
+            juices = project_juices(Juice.objects.filter(is_active=True), fields)
+
+            if category_id:
+                juices = juices.filter(category_id=category_id)
+
+            # ?cursor= switches to keyset pagination ordered by id
+            if 'cursor' in request.query_params:
+                paginator = JuiceCursorPagination()
+            else:
+                paginator = JuicePagination()
+            paginated_juices = paginator.paginate_queryset(juices, request)
+            serializer = JuiceSerializer(paginated_juices, many=True, fields=fields)
+            return paginator.get_paginated_response(serializer.data).data
+
+        return Response(get_cached_catalog_data(request, 'juices', build))
+
+    def get_from_nutrition_catalog(self, request, fields, bounds, sort):
         category_id = request.query_params.get('category_id')
+        try:
+            category_id = int(category_id) if category_id else None
+        except ValueError:
+            return Response(
+                {'error': 'category_id must be a number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-        juices = Juice.objects.filter(is_active=True)
+        ranking = None
+        if sort in POPULARITY_WINDOWS:
+            ranking = popular_juice_ids(days=POPULARITY_WINDOWS[sort])
+            sort = None
 
-        if category_id:
-            juices = juices.filter(category_id=category_id)
+        rows = get_nutrition_catalog().query(bounds, category_id=category_id, sort=sort, ranking=ranking)
 
         paginator = JuicePagination()
-        paginated_juices = paginator.paginate_queryset(juices, request)
-        serializer = JuiceSerializer(paginated_juices, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        page = paginator.paginate_queryset(rows, request)
+        return paginator.get_paginated_response([
+            {name: row[name] for name in fields} for row in page
+        ])
 
 
 class JuiceDetailAPIView(APIView):
 
     def get(self, request, pk):
-        juice = get_object_or_404(Juice, pk=pk, is_active=True)
-        serializer = JuiceSerializer(juice)
-        return Response(serializer.data)
+        fields = parse_juice_fields(request.query_params)
+
+        def build():
+            juice = get_object_or_404(
+                project_juices(Juice.objects.all(), fields),
+                pk=pk,
+                is_active=True
+            )
+            data = JuiceSerializer(juice, fields=fields).data
+            # Sparse fieldset requests get exactly the fields they asked for
+            if 'fields' not in request.query_params:
+                data['recommendations'] = recommended_juices([juice.id])
+            return data
+
+        return Response(get_cached_catalog_data(request, f'juice:{pk}', build))
+
+
+class JuiceSearchAPIView(APIView):
+    """Search-as-you-type over the active menu, with typo tolerance"""
+    MAX_LIMIT = 50
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', 10)), self.MAX_LIMIT)
+        except ValueError:
+            limit = 10
+
+        search_index.ensure_current()
+        results, suggestions = search_index.search(query, limit=max(limit, 1))
+
+        return Response({
+            'query': query,
+            'results': results,
+            'suggestions': suggestions,
+        })
 
 
 class BranchListAPIView(APIView):
     """Get all active branches"""
     def get(self, request):
-        branches = Branch.objects.filter(is_active=True).order_by('city', 'name')
-        serializer = BranchSerializer(branches, many=True)
-        return Response(serializer.data)
+        def build():
+            branches = Branch.objects.filter(is_active=True).order_by('city', 'name')
+            return BranchSerializer(branches, many=True).data
 
+        return Response(get_cached_catalog_data(request, 'branches', build))
 
 
+class NearestBranchAPIView(APIView):
+    """
+    Open branches that deliver to a location, nearest first. Takes ?lat=&lng=
+    or, for a signed-in customer, ?address_id= of a saved address.
+    ?include_closed=true also lists branches that are closed right now.
+    """
+    def get(self, request):
+        address_id = request.query_params.get('address_id')
+        if address_id:
+            from addresses.models import Address
+            if not request.user.is_authenticated:
+                return Response(
+                    {'error': 'Sign in to look up branches for a saved address'},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+            address = Address.objects.filter(id=address_id, user=request.user).first()
+            if address is None:
+                return Response({'error': 'Address not found'}, status=status.HTTP_404_NOT_FOUND)
+            if address.latitude is None or address.longitude is None:
+                return Response(
+                    {'error': 'This address has no location. Please update it with a map pin.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            latitude, longitude = float(address.latitude), float(address.longitude)
+        else:
+            try:
+                latitude = float(request.query_params['lat'])
+                longitude = float(request.query_params['lng'])
+            except (KeyError, ValueError):
+                return Response(
+                    {'error': 'Provide lat and lng, or address_id'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                return Response(
+                    {'error': 'lat/lng out of range'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
 
+        include_closed = request.query_params.get('include_closed', '').lower() in ('1', 'true')
+        branches = branch_locator.nearest(
+            latitude,
+            longitude,
+            timezone.localtime().time(),
+            include_closed=include_closed
+        )
+        return Response({
+            'count': len(branches),
+            'results': branches
+        })
+
+
+
+
+@method_decorator(condition(etag_func=menu_etag), name='get')
 class BranchProductsAPIView(APIView):
     """Get all available products for a specific branch with pagination"""
     pagination_class = JuicePagination
     
     def get(self, request, branch_id):
+        # Plain menu pages are served from the pre-rendered branch snapshot
+        snapshot_page = get_branch_menu_page(request, branch_id)
+        if snapshot_page is not None:
+            return menu_page_response(request, snapshot_page)
+
         try:
             branch = Branch.objects.get(id=branch_id, is_active=True)
         except Branch.DoesNotExist:
@@ -66,23 +230,41 @@ class BranchProductsAPIView(APIView):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Get only available products at this branch
-        branch_products = BranchProduct.objects.filter(
-            branch=branch,
-            is_available=True,
-            product__is_active=True
-        ).select_related('product', 'product__category')
+        # Menu pages default to the card representation
+        fields = parse_juice_fields(request.query_params, default_view='card')
+
+        # Paginate available products in SQL through the availability join
+        juices = project_juices(Juice.objects.filter(
+            is_active=True,
+            branch_availability__branch=branch,
+            branch_availability__is_available=True
+        ), fields).order_by('id')
         
         # Filter by category if provided
         category_id = request.query_params.get('category_id')
         if category_id:
-            branch_products = branch_products.filter(product__category_id=category_id)
+            juices = juices.filter(category_id=category_id)
         
-        products = [bp.product for bp in branch_products]
+        # ?sort=popular / popular_30d: this branch's best sellers first
+        sort = request.query_params.get('sort')
+        if sort in POPULARITY_WINDOWS:
+            ranking = popular_juice_ids(branch.id, POPULARITY_WINDOWS[sort])
+            if ranking:
+                juices = juices.order_by(
+                    Case(
+                        *[When(id=juice_id, then=Value(position)) for position, juice_id in enumerate(ranking)],
+                        default=Value(len(ranking))
+                    ),
+                    'id'
+                )
         
-        # Apply pagination
-        paginator = JuicePagination()
-        paginated_products = paginator.paginate_queryset(products, request)
-        serializer = JuiceSerializer(paginated_products, many=True)
+        # Apply pagination (?cursor= switches to keyset pagination, which
+        # is always ordered by id)
+        if 'cursor' in request.query_params and sort not in POPULARITY_WINDOWS:
+            paginator = JuiceCursorPagination()
+        else:
+            paginator = JuicePagination()
+        paginated_products = paginator.paginate_queryset(juices, request)
+        serializer = JuiceSerializer(paginated_products, many=True, fields=fields)
         
         return paginator.get_paginated_response(serializer.data)
@@ -11,4 +11,5 @@ urlpatterns = [
     # REST API endpoints for mobile app
     path('api/branch-products/', views.StaffBranchProductsAPIView.as_view(), name='staff_branch_products_api'),
     path('api/branch-products/<int:branch_product_id>/toggle/', views.ToggleBranchProductAvailabilityAPIView.as_view(), name='toggle_branch_product_api'),
+    path('api/branch-products/bulk/', views.BulkBranchProductAvailabilityAPIView.as_view(), name='bulk_branch_product_api'),
 ]
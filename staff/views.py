@@ -1,6 +1,7 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib import messages
+from django.db import transaction
 from django.db.models import Count, Q, Sum
 from django.utils import timezone
 from datetime import timedelta
@@ -11,9 +12,12 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 
+from cart.views import is_integer
 from orders.models import Order
 from products.models import BranchProduct, Juice
+from products.images import image_url, image_variants
 from products.serializers import JuiceSerializer
+from products.signals import catalog_changed
 from .decorators import staff_required, get_staff_branch_orders
 
 
@@ -229,7 +233,8 @@ class StaffBranchProductsAPIView(APIView):
                 'name': product.name,
                 'description': product.description,
                 'price': str(product.price),
-                'image': f"https://res.cloudinary.com/dxizjczfh/image/upload/{str(product.image).replace('media/', '', 1)}" if product.image else None,
+                'image': image_url(product.image.name),
+                'image_variants': image_variants(product.image.name),
                 'category': {
                     'id': product.category.id,
                     'name': product.category.name
@@ -295,3 +300,122 @@ class ToggleBranchProductAvailabilityAPIView(APIView):
             'is_available': branch_product.is_available,
             'updated_at': branch_product.updated_at
         }, status=status.HTTP_200_OK)
+
+
+class BulkBranchProductAvailabilityAPIView(APIView):
+    """
+    API endpoint to change availability of many products at staff's branch
+    in one request. Accepts either
+        {"items": [{"branch_product_id": 1, "is_available": false}, ...]}
+    or a branch-wide operation on a category or an ingredient
+        {"category_id": 3, "is_available": false}
+        {"ingredient": "mango", "is_available": false}
+    and returns the branch's new availability map.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # Verify user is staff
+        if not request.user.is_staff:
+            return Response(
+                {'error': 'Only staff members can change product availability'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        # Verify staff has assigned branch
+        if not request.user.assigned_branch:
+            return Response(
+                {'error': 'No branch assigned to this staff member'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        branch = request.user.assigned_branch
+        items = request.data.get('items')
+        category_id = request.data.get('category_id')
+        ingredient = (request.data.get('ingredient') or '').strip()
+
+        if items is not None:
+            if not isinstance(items, list) or not items:
+                return Response(
+                    {'error': 'items must be a non-empty list'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            wanted = {}
+            for item in items:
+                if (
+                    not isinstance(item, dict)
+                    or not is_integer(item.get('branch_product_id'))
+                    or not isinstance(item.get('is_available'), bool)
+                ):
+                    return Response(
+                        {'error': 'Each item needs an integer branch_product_id and a boolean is_available'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+                wanted[item['branch_product_id']] = item['is_available']
+            branch_products = BranchProduct.objects.filter(branch=branch, id__in=wanted)
+        elif category_id is not None or ingredient:
+            is_available = request.data.get('is_available')
+            if not isinstance(is_available, bool):
+                return Response(
+                    {'error': 'is_available must be true or false'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if category_id is not None:
+                try:
+                    category_id = int(category_id)
+                except (TypeError, ValueError):
+                    return Response(
+                        {'error': 'category_id must be a number'},
+                        status=status.HTTP_400_BAD_REQUEST
+                    )
+            branch_products = BranchProduct.objects.filter(branch=branch)
+            if category_id is not None:
+                branch_products = branch_products.filter(product__category_id=category_id)
+            if ingredient:
+                branch_products = branch_products.filter(product__ingredients__icontains=ingredient)
+            wanted = None
+        else:
+            return Response(
+                {'error': 'Provide items, category_id or ingredient'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        with transaction.atomic():
+            branch_products = list(
+                branch_products.select_for_update().only('id', 'is_available', 'updated_at')
+            )
+
+            if wanted is not None:
+                missing = set(wanted) - {bp.id for bp in branch_products}
+                if missing:
+                    return Response(
+                        {'error': f"Products not found in your branch inventory: {sorted(missing)}"},
+                        status=status.HTTP_404_NOT_FOUND
+                    )
+
+            # bulk_update skips auto_now, so stamp updated_at here
+            now = timezone.now()
+            changed = []
+            for bp in branch_products:
+                new_value = wanted[bp.id] if wanted is not None else is_available
+                if bp.is_available != new_value:
+                    bp.is_available = new_value
+                    bp.updated_at = now
+                    changed.append(bp)
+
+            if changed:
+                BranchProduct.objects.bulk_update(changed, ['is_available', 'updated_at'])
+                # One cache/snapshot invalidation for the whole batch
+                catalog_changed(branch_ids=[branch.id])
+
+        availability = dict(
+            BranchProduct.objects.filter(branch=branch).values_list('id', 'is_available')
+        )
+
+        return Response({
+            'message': f"{len(changed)} product(s) updated",
+            'updated_ids': [bp.id for bp in changed],
+            'availability': availability,
+            'available_products': sum(availability.values()),
+            'total_products': len(availability)
+        }, status=status.HTTP_200_OK)
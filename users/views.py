@@ -9,6 +9,7 @@ from .utils import generate_email_otp, generate_phone_otp, generate_password_res
 from rest_framework_simplejwt.tokens import RefreshToken
 from .views_verify import is_otp_expired
 from .models import User
+from cart.guest import GUEST_CART_COOKIE, merge_guest_cart
 
 from .serializers import RegisterSerializer, UserSerializer
 
@@ -98,6 +99,9 @@ class LoginAPIView(APIView):
             )
         
         refresh = RefreshToken.for_user(user)
+
+        # Bring along anything added to the cart before logging in
+        merged_items = merge_guest_cart(request, user)
         
         # Prepare assigned_branch data for staff users
         assigned_branch_data = None
@@ -111,12 +115,13 @@ class LoginAPIView(APIView):
                 'email': user.assigned_branch.email
             }
 
-        return Response(
+        response = Response(
             {
                 "message": "Login successful",
                 "access_token": str(refresh.access_token),
                 "refresh_token": str(refresh),
                 "is_superuser": user.is_superuser,
+                "merged_cart_items": merged_items,
                 "user": {
                     "email": user.email,
                     "full_name": user.full_name,
@@ -127,6 +132,9 @@ class LoginAPIView(APIView):
             },
             status=status.HTTP_200_OK
         )
+        if GUEST_CART_COOKIE in request.COOKIES:
+            response.delete_cookie(GUEST_CART_COOKIE)
+        return response
 
 class ResendEmailOTPAPIView(APIView):
     def post(self, request):